@@ -2,27 +2,40 @@
 from __future__ import annotations
 import os
 import time
-from typing import Optional
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from decimal import Decimal, ROUND_FLOOR
+from typing import Iterable, Optional, Sized
+from hexbytes import HexBytes
 from web3 import Web3
 
-from services.web3_service import Web3Service
+from services.web3_service import get_web3_service, POW10
 from repositories.history_repository import HistoryRepository
 from repositories.monitor_repository import MonitorRepository
 from repositories.action_repository import ActionRepository
 from repositories.meta_repository import MetaRepository  # para el fusible de primera compra
+from utils.config import BuyConfig
+from utils.db import transaction
 from utils.log_config import logger_manager, log_function
 
 logger = logger_manager.setup_logger(__name__)
 
 # ----------------- Config vía entorno -----------------
-PNL_THRESHOLD_PERCENT = float(os.getenv("PNL_THRESHOLD_PERCENT", "2.0"))
-MAX_FEE_BNB = float(os.getenv("MAX_FEE_BNB", "0.02"))
-WBNB_ADDRESS = os.getenv("WBNB_ADDRESS")
+# Se resuelve una vez al importar: umbrales, fusible FIRST_REAL_BUY, cap de gasto en wei
+# y direcciones ya en checksum. Es la configuración por defecto del controlador.
+CFG = BuyConfig.from_env()
 
-# Fusible y cap de gasto para la primera prueba real
-FIRST_REAL_BUY = os.getenv("FIRST_REAL_BUY", "false").lower() == "true"
-TEST_MAX_SPEND_BNB = float(os.getenv("TEST_MAX_SPEND_BNB", "0.001"))
-DRY_RUN = os.getenv("DRY_RUN", "true").lower() == "true"
+# Propuestas simultáneas en procesar_tokens (cada una es I/O contra el nodo)
+AUTOBUY_MAX_WORKERS = int(os.getenv("AUTOBUY_MAX_WORKERS", "16"))
+
+# Lecturas de gas lanzadas en paralelo con la cotización (ver _quote_buy)
+_GAS_POOL = ThreadPoolExecutor(max_workers=2, thread_name_prefix="autobuy-gas")
+
+# topic0 del evento ERC20 Transfer (bytes, comparable directamente con HexBytes)
+_TRANSFER_TOPIC = bytes(Web3.keccak(text="Transfer(address,address,uint256)"))
+
+# Motivos de compra pendiente de usuario (ver DiscoveryController)
+REASON_PNL_LOW = "PNL_BELOW_THRESHOLD"
+REASON_FEE_HIGH = "FEE_HIGH"
 
 
 class AutoBuyController:
@@ -38,52 +51,77 @@ class AutoBuyController:
       - DiscoveryController puede llamar a procesar_token(token) y aquí delega a propose_buy con cap de gasto.
     """
 
-    def __init__(self, db_path: str) -> None:
-        self.w3s = Web3Service()
+    def __init__(self, db_path: str, config: BuyConfig | None = None) -> None:
+        self.cfg = config or CFG
+        self.w3s = get_web3_service()
         self.db_path = db_path or os.getenv("DB_PATH", "./data/memecoins.db")
         self.history_repo = HistoryRepository(db_path=self.db_path)
         self.monitor_repo = MonitorRepository(db_path=self.db_path)
         self.action_repo = ActionRepository(db_path=self.db_path)
         self.meta = MetaRepository(db_path=self.db_path)
+        self._cap_wei = self.cfg.cap_wei
+        # wallet como 20 bytes crudos: se compara directamente con el final de topics[2]
+        self._wallet_bytes = bytes.fromhex(self.cfg.wallet_cs[2:]) if self.cfg.wallet_cs else None
 
     # ---------------- helpers fusible/cap ----------------
     def _first_buy_already_done(self) -> bool:
         return self.meta.get("first_buy_done", "0") == "1"
 
     def _apply_test_cap_wei(self, amount_bnb_wei: int) -> int:
-        try:
-            cap_wei = Web3.to_wei(TEST_MAX_SPEND_BNB, "ether")
-        except Exception:
-            cap_wei = Web3.to_wei(0.001, "ether")
-        if amount_bnb_wei > cap_wei:
-            logger.info(
-                f"[autobuy] Cap de prueba activo. Ajuste de "
-                f"{self.w3s.wei_to_bnb(amount_bnb_wei)} BNB → {self.w3s.wei_to_bnb(cap_wei)} BNB"
-            )
-            return cap_wei
-        return amount_bnb_wei
+        if amount_bnb_wei <= self._cap_wei:
+            return amount_bnb_wei
+        logger.info(
+            "[autobuy] Cap de prueba activo. Ajuste de %s BNB → %s BNB",
+            self.w3s.wei_to_bnb(amount_bnb_wei), self.w3s.wei_to_bnb(self._cap_wei)
+        )
+        return self._cap_wei
 
     # ---------------- utilidades en BNB ----------------
-    def _estimate_fee_bnb(self, gas_used: int, gas_price_wei: int) -> float:
-        wei_cost = (gas_price_wei or 0) * (gas_used or 0)
-        return wei_cost / 1e18
+    def _estimate_fee_wei(self, gas_used: int, gas_price_wei: int) -> int:
+        return int(gas_price_wei or 0) * int(gas_used or 0)
 
-    def _compute_pnl_percent(self, expected_unit_cost_bnb: float, current_price_bnb: float) -> float:
-        denom = max(current_price_bnb, 1e-18)
-        return ((expected_unit_cost_bnb - current_price_bnb) / denom) * 100.0
+    def _tx_fee_wei(self, tx: dict) -> int:
+        # legacy -> gasPrice; EIP-1559 (modo auto en BSC) no trae gasPrice y
+        # se usa maxFeePerGas como cota superior. Sin esto la fee salía 0 y FEE_HIGH nunca saltaba.
+        gas_price_wei = tx.get("gasPrice") or tx.get("maxFeePerGas") or 0
+        return self._estimate_fee_wei(tx.get("gas", 0), gas_price_wei)
 
-    def _preview_amount_out_min(self, token_address: str, amount_bnb_wei: int) -> int:
-        if not WBNB_ADDRESS:
-            # Falla controlada si falta la variable
-            logger.error("WBNB_ADDRESS no configurada en entorno.")
+    def _unit_cost_bnb(
+        self,
+        price_native_bnb: float,
+        buy_fee_bnb_per_unit: float,
+        transfer_fee_bnb_per_unit: float,
+        fee_wei_total: int,
+        expected_out_tokens: float,
+    ) -> float:
+        # coste unitario esperado: precio + tasas + gas prorrateado por token recibido
+        gas_bnb_per_unit = fee_wei_total / 1e18 / max(expected_out_tokens, 1e-18)
+        return price_native_bnb + buy_fee_bnb_per_unit + transfer_fee_bnb_per_unit + gas_bnb_per_unit
+
+    def _compute_pnl_bps(self, expected_unit_cost_bnb: float, current_price_bnb: float) -> int:
+        # entero en puntos básicos; sin precio actual no hay PnL que valga (no se compra en automático).
+        # Decimal(float) es exacto: precios por debajo de 1 wei no se truncan a 0
+        current = Decimal(current_price_bnb)
+        if current <= 0:
             return 0
-        path = [WBNB_ADDRESS, token_address]
-        return self.w3s.get_amount_out_min(amount_bnb_wei, path, None)
+        ratio = (Decimal(expected_unit_cost_bnb) - current) * 10_000 / current
+        return int(ratio.to_integral_value(rounding=ROUND_FLOOR))
 
-    def _expected_out_tokens(self, token_address: str, amount_out_min_raw: int) -> float:
-        erc20 = self.w3s.load_erc20(token_address)
-        decimals = self.w3s.get_token_decimals(erc20)
-        return amount_out_min_raw / (10 ** decimals)
+    def _quote_buy(self, token_address: str, amount_bnb_wei: int) -> tuple[int, float]:
+        """
+        amountOutMin (raw) y salida esperada en tokens. getAmountsOut + decimals()
+        se piden al nodo en un único round-trip (ver Web3Service.quote_buy).
+        """
+        if not self.cfg.wbnb_cs:
+            # Falla controlada si falta la variable
+            logger.error("WBNB_ADDRESS no configurada en entorno.")
+            return 0, 0.0
+        # el gas no depende de la cotización: se pide a la vez y el build lo toma de la caché
+        gas_fut = _GAS_POOL.submit(self.w3s.warm_gas_fees)
+        amount_out_min, decimals = self.w3s.quote_buy(amount_bnb_wei, token_address)
+        if amount_out_min > 0:
+            gas_fut.result()
+        return amount_out_min, amount_out_min / POW10[decimals]
 
     # ============================
     # Propuesta de compra (fase 0)
@@ -102,7 +140,7 @@ class AutoBuyController:
         transfer_fee_bnb_per_unit: float = 0.0
     ) -> dict:
         # Fusible de primera compra: si activo y ya se hizo una compra real, bloquea
-        if FIRST_REAL_BUY and self._first_buy_already_done():
+        if self.cfg.first_real_buy and self._first_buy_already_done():
             logger.info("[autobuy] Fusible activo: primera compra ya realizada. Bloqueando nuevas compras.")
             return {"ok": False, "reason": "FIRST_BUY_FUSE_BLOCKED"}
 
@@ -110,28 +148,30 @@ class AutoBuyController:
         amount_bnb_wei = self._apply_test_cap_wei(amount_bnb_wei)
 
         # 1) amountOutMin y salida esperada (para prorratear gas)
-        amount_out_min = self._preview_amount_out_min(token_address, amount_bnb_wei)
+        amount_out_min, expected_out_tokens = self._quote_buy(token_address, amount_bnb_wei)
         if not amount_out_min or amount_out_min <= 0:
             return {"ok": False, "reason": "amountOutMin inválido"}
 
-        expected_out_tokens = self._expected_out_tokens(token_address, amount_out_min)
         if expected_out_tokens <= 0:
             return {"ok": False, "reason": "expected_out_tokens inválido"}
 
         # 2) construir tx y estimar gas->fee BNB
-        tx = self.w3s.build_swap_exact_eth_for_tokens(amount_bnb_wei, amount_out_min, token_address)
-        fee_bnb_total = self._estimate_fee_bnb(tx.get("gas", 0), tx.get("gasPrice", 0) or 0)
-
-        gas_bnb_per_unit = fee_bnb_total / max(expected_out_tokens, 1e-18)
-        expected_unit_cost_bnb = (
-            price_native_bnb + buy_fee_bnb_per_unit + transfer_fee_bnb_per_unit + gas_bnb_per_unit
+        # la cotización > 0 ya garantiza que el par existe: sin getPair extra
+        tx = self.w3s.build_swap_exact_eth_for_tokens(amount_bnb_wei, amount_out_min, token_address, check_pool=False)
+        fee_wei_total = self._tx_fee_wei(tx)
+        expected_unit_cost_bnb = self._unit_cost_bnb(
+            price_native_bnb, buy_fee_bnb_per_unit, transfer_fee_bnb_per_unit, fee_wei_total, expected_out_tokens
         )
 
-        pnl_percent = self._compute_pnl_percent(expected_unit_cost_bnb, current_price_bnb)
+        pnl_bps = self._compute_pnl_bps(expected_unit_cost_bnb, current_price_bnb)
 
         # 3) reglas de negocio -> acciones pendientes si fuera de umbral o fee demasiado alta
-        if pnl_percent < PNL_THRESHOLD_PERCENT or fee_bnb_total > MAX_FEE_BNB:
-            reason = "PNL_BELOW_THRESHOLD" if pnl_percent < PNL_THRESHOLD_PERCENT else "FEE_HIGH"
+        reason = (
+            REASON_PNL_LOW if pnl_bps < self.cfg.pnl_threshold_bps
+            else REASON_FEE_HIGH if fee_wei_total > self.cfg.max_fee_wei
+            else None
+        )
+        if reason is not None:
             self.action_repo.registrar_accion(
                 pair_address=pair_address,
                 tipo="compra",
@@ -142,8 +182,8 @@ class AutoBuyController:
                 "ok": True,
                 "mode": "PENDING_USER",
                 "reason": reason,
-                "pnl_percent": pnl_percent,
-                "fee_bnb_total": fee_bnb_total
+                "pnl_percent": pnl_bps / 100,
+                "fee_bnb_total": self.w3s.wei_to_bnb(fee_wei_total)
             }
 
         # 4) dentro de parámetros -> iniciar compra inmediata
@@ -174,17 +214,21 @@ class AutoBuyController:
         buy_entry_price_bnb: float,
         buy_price_with_fees_bnb: float
     ) -> dict:
-        history_id = self.history_repo.create_buy(
-            pair_address=pair_address,
-            token_address=token_address,
-            symbol=symbol,
-            name=name,
-            buy_entry_price=buy_entry_price_bnb,
-            buy_price_with_fees=buy_price_with_fees_bnb,
-            buy_date_ts=int(time.time())
-        )
-        # guardar el vínculo en monitor_state
-        self.monitor_repo.set_history_id(pair_address, history_id)
+        # history + vínculo en monitor_state en una sola transacción (un commit, y nunca uno sin el otro)
+        with transaction(self.db_path) as conn:
+            history_id = self.history_repo.create_buy(
+                pair_address=pair_address,
+                token_address=token_address,
+                symbol=symbol,
+                name=name,
+                buy_entry_price=buy_entry_price_bnb,
+                buy_price_with_fees=buy_price_with_fees_bnb,
+                buy_date_ts=time.time_ns() // 1_000_000_000,
+                conn=conn
+            )
+            self.monitor_repo.set_history_id(pair_address, history_id, conn=conn)
+        # ya confirmado el commit: ninguna lectura concurrente puede dejar en caché el id anterior
+        self.monitor_repo.cache_history_id(pair_address, history_id)
         return {
             "ok": True,
             "mode": "IMMEDIATE",
@@ -211,7 +255,7 @@ class AutoBuyController:
         Recalculo amounts/gas y procedo a iniciar compra.
         """
         # Fusible de primera compra
-        if FIRST_REAL_BUY and self._first_buy_already_done():
+        if self.cfg.first_real_buy and self._first_buy_already_done():
             logger.info("[autobuy] Fusible activo en confirm_pending_buy: primera compra ya realizada.")
             return {"ok": False, "reason": "FIRST_BUY_FUSE_BLOCKED"}
 
@@ -222,15 +266,16 @@ class AutoBuyController:
         # Cap de gasto
         amount_bnb_wei = self._apply_test_cap_wei(amount_bnb_wei)
 
-        amount_out_min = self._preview_amount_out_min(token_address, amount_bnb_wei)
+        amount_out_min, expected_out_tokens = self._quote_buy(token_address, amount_bnb_wei)
         if not amount_out_min or amount_out_min <= 0:
             return {"ok": False, "reason": "amountOutMin inválido tras confirmación"}
 
-        tx = self.w3s.build_swap_exact_eth_for_tokens(amount_bnb_wei, amount_out_min, token_address)
-        fee_bnb_total = self._estimate_fee_bnb(tx.get("gas", 0), tx.get("gasPrice", 0) or 0)
-        expected_out_tokens = self._expected_out_tokens(token_address, amount_out_min)
-        gas_bnb_per_unit = fee_bnb_total / max(expected_out_tokens, 1e-18)
-        buy_price_with_fees_bnb = price_native_bnb + buy_fee_bnb_per_unit + transfer_fee_bnb_per_unit + gas_bnb_per_unit
+        # la cotización > 0 ya garantiza que el par existe: sin getPair extra
+        tx = self.w3s.build_swap_exact_eth_for_tokens(amount_bnb_wei, amount_out_min, token_address, check_pool=False)
+        fee_wei_total = self._tx_fee_wei(tx)
+        buy_price_with_fees_bnb = self._unit_cost_bnb(
+            price_native_bnb, buy_fee_bnb_per_unit, transfer_fee_bnb_per_unit, fee_wei_total, expected_out_tokens
+        )
 
         # iniciar compra
         result = self._start_buy_immediate(
@@ -258,9 +303,15 @@ class AutoBuyController:
         history_id = self.monitor_repo.get_history_id(pair_address)
         if not history_id:
             return {"ok": False, "reason": "history_id no encontrado en monitor"}
-        self.history_repo.set_buy_final_result(history_id, buy_real_price_bnb, buy_amount_tokens)
+        self._persist_buy_result(pair_address, history_id, buy_real_price_bnb, buy_amount_tokens)
         return {"ok": True, "history_id": history_id}
 
+    def _persist_buy_result(self, pair_address: str, history_id: int, buy_real_price_bnb: float, buy_amount_tokens: float) -> None:
+        # history + copia del precio en monitor_state (la venta la lee de ahí sin JOIN), un solo commit
+        with transaction(self.db_path) as conn:
+            self.history_repo.set_buy_final_result(history_id, buy_real_price_bnb, buy_amount_tokens, conn=conn)
+            self.monitor_repo.set_buy_real_price(pair_address, buy_real_price_bnb, conn=conn)
+
     # =========================
     # Finalizar venta (fase 3)
     # =========================
@@ -274,14 +325,13 @@ class AutoBuyController:
         sell_amount_tokens: float,
         bnb_amount: float
     ) -> dict:
-        history_id = self.monitor_repo.get_history_id(pair_address)
-        if not history_id:
+        pos = self.monitor_repo.get_position(pair_address)
+        if not pos:
             return {"ok": False, "reason": "history_id no encontrado en monitor"}
-        h = self.history_repo.get_by_id(history_id)
-        if not h or h.get("buy_real_price") is None:
+        history_id, buy_real_price_bnb = pos
+        if buy_real_price_bnb is None:
             return {"ok": False, "reason": "compra real no registrada todavía"}
 
-        buy_real_price_bnb = float(h["buy_real_price"])
         denom = max(buy_real_price_bnb, 1e-18)
         pnl_percent = ((sell_real_price_bnb - buy_real_price_bnb) / denom) * sell_amount_tokens * 100.0
 
@@ -299,32 +349,34 @@ class AutoBuyController:
         return {"ok": True, "history_id": history_id, "pnl": pnl_percent, "bnb_amount": bnb_amount}
 
     @log_function
-    def await_and_record_buy_receipt(self, pair_address: str, token_address: str, token_decimals: int, tx_hash: str) -> dict:
+    def await_and_record_buy_receipt(self, pair_address: str, token_address: str, token_decimals: int | None, tx_hash: str) -> dict:
         """
         Espera el receipt de la compra, parsea cuántos tokens se recibieron realmente,
         calcula el precio real unitario (incluyendo gas) y lo persiste en history.
+        Si token_decimals es None se usan los decimals cacheados en Web3Service.
         Si el fusible está activo y es la primera compra real exitosa (no DRY_RUN),
         marca 'first_buy_done' para bloquear siguientes.
         """
+        if token_decimals is None:
+            token_decimals = self.w3s.token_decimals(token_address)
         receipt = self.w3s.wait_for_receipt(tx_hash)
         tx = self.w3s.get_transaction(tx_hash)
-        wallet = Web3.to_checksum_address(os.getenv("WALLET_ADDRESS"))
         token_addr_cs = Web3.to_checksum_address(token_address)
 
-        TRANSFER_TOPIC = Web3.keccak(text="Transfer(address,address,uint256)").hex()
         amount_received_tokens = None
 
         for log in receipt["logs"]:
-            # topic0 puede venir bytes/HexBytes/str; normalizamos a hex
-            topic0 = log["topics"][0].hex() if hasattr(log["topics"][0], "hex") else (log["topics"][0] if isinstance(log["topics"][0], str) else None)
-            if log["address"].lower() == token_addr_cs.lower() and topic0 == TRANSFER_TOPIC:
-                # topics[2] = 'to'
-                to_hex = log["topics"][2].hex() if hasattr(log["topics"][2], "hex") else str(log["topics"][2])
-                to_addr = Web3.to_checksum_address("0x" + to_hex[-40:])
-                if to_addr == wallet:
-                    raw = int(log["data"], 16)
-                    amount_received_tokens = raw / (10 ** token_decimals)
-                    break
+            # web3 entrega topics como HexBytes (subclase de bytes) y address en checksum
+            topics = log["topics"]
+            if len(topics) < 3 or topics[0] != _TRANSFER_TOPIC or log["address"] != token_addr_cs:
+                continue
+            # topics[2] = 'to' (address con padding a 32 bytes; los 20 últimos son la dirección)
+            if topics[2][-20:] == self._wallet_bytes:
+                # data = uint256 value (32 bytes big-endian)
+                data = log["data"]
+                raw = int.from_bytes(data if isinstance(data, bytes) else HexBytes(data), "big")
+                amount_received_tokens = raw / POW10[token_decimals]
+                break
 
         if amount_received_tokens is None or amount_received_tokens <= 0:
             return {"ok": False, "reason": "No se pudo determinar la cantidad real recibida (Transfer no encontrado)."}
@@ -339,10 +391,10 @@ class AutoBuyController:
         if not history_id:
             return {"ok": False, "reason": "history_id no encontrado en monitor"}
 
-        self.history_repo.set_buy_final_result(history_id, buy_real_price_bnb, amount_received_tokens)
+        self._persist_buy_result(pair_address, history_id, buy_real_price_bnb, amount_received_tokens)
 
         # Marcar fusible como usado SOLO si no es DRY_RUN y el flag está habilitado
-        if FIRST_REAL_BUY and not DRY_RUN:
+        if self.cfg.first_real_buy and not self.cfg.dry_run:
             logger.info("[autobuy] Marcando 'first_buy_done' tras receipt OK (no DRY_RUN).")
             self.meta.set("first_buy_done", "1")
 
@@ -364,16 +416,12 @@ class AutoBuyController:
         Limita el gasto a TEST_MAX_SPEND_BNB (por defecto 0.001 BNB).
         """
         # Si el fusible está activo y ya se hizo la primera compra, bloquea
-        if FIRST_REAL_BUY and self._first_buy_already_done():
+        if self.cfg.first_real_buy and self._first_buy_already_done():
             logger.info("[autobuy] Fusible activo en procesar_token: primera compra ya realizada.")
             return {"ok": False, "reason": "FIRST_BUY_FUSE_BLOCKED"}
 
-        # Cap de gasto (convierte a wei)
-        try:
-            amount_bnb_wei = Web3.to_wei(TEST_MAX_SPEND_BNB, "ether")
-        except Exception:
-            amount_bnb_wei = Web3.to_wei(0.001, "ether")
-        amount_bnb_wei = self._apply_test_cap_wei(amount_bnb_wei)
+        # Cap de gasto (ya en wei)
+        amount_bnb_wei = self._cap_wei
 
         # Precio nativo actual como referencia
         price_native_bnb = float(getattr(token, "price_native", 0.0) or 0.0)
@@ -394,3 +442,33 @@ class AutoBuyController:
             buy_fee_bnb_per_unit=buy_fee_bnb_per_unit,
             transfer_fee_bnb_per_unit=transfer_fee_bnb_per_unit,
         )
+
+    @log_function
+    def procesar_tokens(self, tokens: Iterable) -> dict[str, dict]:
+        """
+        Procesa un lote de tokens descubiertos en paralelo (hilos, acotado por AUTOBUY_MAX_WORKERS).
+        Las propuestas son independientes y están dominadas por la latencia RPC.
+        Con el fusible FIRST_REAL_BUY activo se procesan en serie para no lanzar varias compras a la vez.
+        tokens puede ser un generador: cada token se envía al pool en cuanto se produce, de modo que
+        la etapa previa (p. ej. filtros de discovery) se solapa con las propuestas ya en curso.
+        Devuelve {pair_address: resultado de procesar_token}.
+        """
+        if isinstance(tokens, Sized):
+            if not tokens:
+                return {}
+            workers = max(1, min(AUTOBUY_MAX_WORKERS, len(tokens)))
+        else:
+            workers = AUTOBUY_MAX_WORKERS
+        if self.cfg.first_real_buy:
+            workers = 1
+        resultados: dict[str, dict] = {}
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="autobuy") as ex:
+            futures = {ex.submit(self.procesar_token, t): getattr(t, "pair_address") for t in tokens}
+            for fut in as_completed(futures):
+                pair = futures[fut]
+                try:
+                    resultados[pair] = fut.result()
+                except Exception as e:
+                    logger.error("[autobuy] error procesando %s: %s", pair, e)
+                    resultados[pair] = {"ok": False, "reason": str(e)}
+        return resultados
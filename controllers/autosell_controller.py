@@ -1,9 +1,11 @@
 # controllers/autosell_controller.py
 from __future__ import annotations
 import os, time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
 from typing import Optional
 
-from services.web3_service import Web3Service
+from services.web3_service import get_web3_service, POW10
 from repositories.history_repository import HistoryRepository
 from repositories.monitor_repository import MonitorRepository
 from utils.log_config import logger_manager, log_function
@@ -11,6 +13,11 @@ from utils.log_config import logger_manager, log_function
 logger = logger_manager.setup_logger(__name__)
 
 WBNB_ADDRESS = os.getenv("WBNB_ADDRESS")
+WALLET_ADDRESS = os.getenv("WALLET_ADDRESS")
+ROUTER_ADDRESS = os.getenv("ROUTER_ADDRESS", "0x10ED43C718714eb63d5aA57B78B54704E256024E")
+
+# Lecturas independientes tras la venta (tx, balance, history) se lanzan en paralelo
+_IO_POOL = ThreadPoolExecutor(max_workers=4, thread_name_prefix="autosell-io")
 
 class AutoSellController:
     """
@@ -21,20 +28,26 @@ class AutoSellController:
       - actualiza history con sell_* y resultados
     """
     def __init__(self, db_path: str) -> None:
-        self.w3s = Web3Service()
+        self.w3s = get_web3_service()
         self.history_repo = HistoryRepository(db_path=db_path)
         self.monitor_repo = MonitorRepository(db_path=db_path)
 
     # -------- utilidades --------
+    # decimals() es inmutable: Web3Service lo cachea por dirección, sin instanciar el contrato
     def _tokens_to_raw(self, token_address: str, amount_tokens: float) -> int:
-        erc20 = self.w3s.load_erc20(token_address)
-        decimals = self.w3s.get_token_decimals(erc20)
-        return int(round(amount_tokens * (10 ** decimals)))
+        # escalado decimal exacto: amount * 10**18 en float se desvía en cantidades > 2**53 raw
+        decimals = self.w3s.token_decimals(token_address)
+        return int(Decimal(repr(float(amount_tokens))).scaleb(decimals).to_integral_value())
 
     def _raw_to_tokens(self, token_address: str, amount_raw: int) -> float:
-        erc20 = self.w3s.load_erc20(token_address)
-        decimals = self.w3s.get_token_decimals(erc20)
-        return amount_raw / (10 ** decimals)
+        decimals = self.w3s.token_decimals(token_address)
+        return amount_raw / POW10[decimals]
+
+    def _tx_and_balance(self, tx_hash: str) -> tuple[dict, int]:
+        """get_transaction y wei_balance son independientes una vez minada la tx: dos RPC a la vez."""
+        tx_fut = _IO_POOL.submit(self.w3s.get_transaction, tx_hash)
+        post_wei = self.w3s.wei_balance()
+        return tx_fut.result(), post_wei
 
     # -------- API --------
     @log_function
@@ -43,28 +56,36 @@ class AutoSellController:
         pair_address: str,
         token_address: str,
         sell_amount_tokens: float,
-        slippage_percent: float
+        slippage_percent: float,
+        sell_amount_raw: Optional[int] = None
     ) -> dict:
         """
         Devuelve dict con approve_tx (opcional), sell_tx y amount_out_min_bnb_wei.
+        sell_amount_raw (p. ej. token_balance_raw) tiene prioridad sobre sell_amount_tokens:
+        vender el saldo exacto sin pasar por float.
         """
-        # 1) convertir a "raw"
-        amount_in_raw = self._tokens_to_raw(token_address, sell_amount_tokens)
+        # 1) convertir a "raw" (decimals ya cacheados desde la compra)
+        amount_in_raw = (int(sell_amount_raw) if sell_amount_raw is not None
+                         else self._tokens_to_raw(token_address, sell_amount_tokens))
 
-        # 2) amountOutMin en BNB
-        amount_out_min_bnb_wei = self.w3s.get_amount_out_min_token_to_bnb(token_address, amount_in_raw, slippage_percent)
+        # 2) amountOutMin en BNB y allowance en un único round-trip (Multicall3)
+        amount_out_min_bnb_wei, allowance = self.w3s.quote_sell(
+            token_address, amount_in_raw, WALLET_ADDRESS, ROUTER_ADDRESS, slippage_percent
+        )
         if amount_out_min_bnb_wei <= 0:
             return {"ok": False, "reason": "amountOutMin inválido para venta"}
 
-        # 3) allowance y approve si hace falta
-        owner = os.getenv("WALLET_ADDRESS")
-        allowance = self.w3s.allowance(token_address, owner, os.getenv("ROUTER_ADDRESS"))
+        # 3) tx de venta, y approve si hace falta: son independientes (gas/fees/estimate cada una),
+        #    se construyen a la vez; la venta va detrás del approve, con el nonce siguiente
         approve_tx = None
         if allowance < amount_in_raw:
-            approve_tx = self.w3s.build_approve(token_address, os.getenv("ROUTER_ADDRESS"), amount_in_raw)
-
-        # 4) construir tx de venta
-        sell_tx = self.w3s.build_swap_exact_tokens_for_eth(token_address, amount_in_raw, amount_out_min_bnb_wei)
+            approve_fut = _IO_POOL.submit(self.w3s.build_approve, token_address, ROUTER_ADDRESS, amount_in_raw)
+            sell_tx = self.w3s.build_swap_exact_tokens_for_eth(
+                token_address, amount_in_raw, amount_out_min_bnb_wei, nonce_offset=1
+            )
+            approve_tx = approve_fut.result()
+        else:
+            sell_tx = self.w3s.build_swap_exact_tokens_for_eth(token_address, amount_in_raw, amount_out_min_bnb_wei)
 
         return {
             "ok": True,
@@ -86,17 +107,40 @@ class AutoSellController:
         """
         Llamar tras confirmar la venta para persistir valores en history y cerrar el ciclo.
         """
-        history_id = self.monitor_repo.get_history_id(pair_address)
-        if not history_id:
-            return {"ok": False, "reason": "history_id no encontrado en monitor"}
+        return self._finalize_sell_common(
+            pair_address, self.monitor_repo.get_position(pair_address),
+            sell_entry_price_bnb, sell_price_with_fees_bnb, sell_real_price_bnb, sell_amount_tokens, bnb_amount
+        )
 
-        h = self.history_repo.get_by_id(history_id)
-        if not h or h.get("buy_real_price") is None:
+    def _finalize_sell_common(
+        self,
+        pair_address: str,
+        pos: Optional[tuple[int, Optional[float]]],
+        sell_entry_price_bnb: Optional[float],
+        sell_price_with_fees_bnb: Optional[float],
+        sell_real_price_bnb: float,
+        sell_amount_tokens: float,
+        bnb_amount: Optional[float] = None
+    ) -> dict:
+        """
+        Cierre común de record_sell_result / send_and_record_sell a partir de
+        (history_id, buy_real_price) de monitor_state (get_position): pnl, finalize_sell y
+        limpieza del history_id en monitor.
+        Si bnb_amount es None se calcula como (venta - compra) * cantidad.
+        """
+        if not pos:
+            return {"ok": False, "reason": "history_id no encontrado en monitor"}
+        history_id, buy_real_price = pos
+        if buy_real_price is None:
             return {"ok": False, "reason": "compra real no registrada todavía"}
 
-        buy_real_price_bnb = float(h["buy_real_price"])
-        denom = max(buy_real_price_bnb, 1e-18)
-        pnl_percent = ((sell_real_price_bnb - buy_real_price_bnb) / denom) * sell_amount_tokens * 100.0
+        buy_real_price_bnb = float(buy_real_price)
+        sell_amount_tokens = float(sell_amount_tokens)
+        # ganancia en BNB por token vendido; pnl = diff / precio compra * cantidad * 100
+        diff = sell_real_price_bnb - buy_real_price_bnb
+        pnl_percent = diff / max(buy_real_price_bnb, 1e-18) * sell_amount_tokens * 100.0
+        if bnb_amount is None:
+            bnb_amount = diff * sell_amount_tokens
 
         self.history_repo.finalize_sell(
             history_id=history_id,
@@ -107,7 +151,6 @@ class AutoSellController:
             pnl=pnl_percent,
             bnb_amount=bnb_amount
         )
-
         self.monitor_repo.clear_history_id(pair_address)
         return {"ok": True, "history_id": history_id, "pnl": pnl_percent, "bnb_amount": bnb_amount}
 
@@ -124,20 +167,18 @@ class AutoSellController:
         # 1) balance antes
         pre_wei = self.w3s.wei_balance()
 
-        # 2) enviar
+        # 2) enviar; la posición no depende del receipt: se consulta mientras se espera
         tx_hash = self.w3s.sign_and_send(sell_tx)
+        position_fut = _IO_POOL.submit(self.monitor_repo.get_position, pair_address)
 
-        # 3) esperar receipt y datos de gas
+        # 3) esperar receipt; tx (gas) y balance después, en paralelo
         receipt = self.w3s.wait_for_receipt(tx_hash)
-        tx = self.w3s.get_transaction(tx_hash)
+        tx, post_wei = self._tx_and_balance(tx_hash)
         gas_used = int(receipt["gasUsed"])
         gas_price = int(tx.get("gasPrice") or 0)
         gas_cost_wei = gas_used * gas_price
 
-        # 4) balance después
-        post_wei = self.w3s.wei_balance()
-
-        # 5) delta neto y bruto recibido
+        # 4) delta neto y bruto recibido
         delta_net_wei = post_wei - pre_wei   # incluye el gas restado
         bnb_net = self.w3s.wei_to_bnb(delta_net_wei)
         bnb_gas = self.w3s.wei_to_bnb(gas_cost_wei)
@@ -145,35 +186,21 @@ class AutoSellController:
 
         sell_real_price_bnb = bnb_bruto_recibido / max(sell_amount_tokens, 1e-18)
 
-        # 6) recuperar buy_real_price y cerrar ciclo con pnl & bnb_amount
-        history_id = self.monitor_repo.get_history_id(pair_address)
-        if not history_id:
-            return {"ok": False, "reason": "history_id no encontrado en monitor"}
-        h = self.history_repo.get_by_id(history_id)
-        if not h or h.get("buy_real_price") is None:
-            return {"ok": False, "reason": "Compra real no registrada"}
-
-        buy_real_price_bnb = float(h["buy_real_price"])
-        pnl_percent = ((sell_real_price_bnb - buy_real_price_bnb) / max(buy_real_price_bnb, 1e-18)) * sell_amount_tokens * 100.0
-        bnb_amount = (sell_real_price_bnb - buy_real_price_bnb) * sell_amount_tokens
-
-        self.history_repo.finalize_sell(
-            history_id=history_id,
-            sell_entry_price=sell_real_price_bnb,        # o el entry al iniciar venta si lo guardas por separado
-            sell_price_with_fees=sell_real_price_bnb,    # si estimas fees aparte, pásalas; aquí usamos real
-            sell_real_price=sell_real_price_bnb,
-            sell_amount=sell_amount_tokens,
-            pnl=pnl_percent,
-            bnb_amount=bnb_amount
+        # 5) recuperar buy_real_price y cerrar ciclo con pnl & bnb_amount
+        # entry / with_fees = precio real: no se estiman fees de venta por separado
+        res = self._finalize_sell_common(
+            pair_address, position_fut.result(),
+            sell_real_price_bnb, sell_real_price_bnb, sell_real_price_bnb, sell_amount_tokens
         )
-        self.monitor_repo.clear_history_id(pair_address)
+        if not res["ok"]:
+            return res
 
         return {
             "ok": True,
-            "history_id": history_id,
+            "history_id": res["history_id"],
             "tx_hash": tx_hash,
             "sell_real_price_bnb": sell_real_price_bnb,
-            "bnb_amount": bnb_amount,
+            "bnb_amount": res["bnb_amount"],
             "gas_used": gas_used
         }
         
@@ -195,17 +222,14 @@ class AutoSellController:
         # 2) enviar
         tx_hash = self.w3s.sign_and_send(sell_tx)
 
-        # 3) receipt + gas
+        # 3) receipt; tx (gas) y balance BNB después, en paralelo
         receipt = self.w3s.wait_for_receipt(tx_hash)
-        tx = self.w3s.get_transaction(tx_hash)
+        tx, post_wei = self._tx_and_balance(tx_hash)
         gas_used = int(receipt["gasUsed"])
         gas_price = int(tx.get("gasPrice") or 0)
         gas_cost_wei = gas_used * gas_price
 
-        # 4) balance BNB después
-        post_wei = self.w3s.wei_balance()
-
-        # 5) delta y bruto
+        # 4) delta y bruto
         delta_net_wei = post_wei - pre_wei
         bnb_net = self.w3s.wei_to_bnb(delta_net_wei)
         bnb_gas = self.w3s.wei_to_bnb(gas_cost_wei)
@@ -6,7 +6,7 @@ from models.token import Token
 from controllers.autobuy_controller import AutoBuyController
 from services.discovery_service import DiscoveryService
 from services.goplus_service import GoplusService
-from services.telegram_service import TelegramService
+from services.telegram_service import TelegramService, get_telegram_service
 from repositories.token_repository import TokenRepository
 from utils.log_config import logger_manager, log_function
 
@@ -40,24 +40,67 @@ class DiscoveryController:
         self.discovery_service = discovery_service or DiscoveryService()
         self.autobuy_controller = autobuy_controller or AutoBuyController(db_path=self.db_path)
         self.token_repository = token_repository or TokenRepository()
-        self.telegram = telegram or TelegramService()
+        self.telegram = telegram or get_telegram_service()
         self.goplus = goplus or GoplusService()
 
     @log_function
     def buscar_pares_con_bnb(self) -> List[Token]:
         candidatos = self.discovery_service.discover_new_tokens()
-        nuevos = [t for t in candidatos if t and getattr(t, "pair_address", None)
-                  and not self.token_repository.exists(t.pair_address)]
-        logger.debug(f"[discovery_controller] nuevos={len(nuevos)}")
+        candidatos = [t for t in candidatos if t and getattr(t, "pair_address", None)]
+        # una sola consulta para todo el lote en lugar de un exists() por candidato
+        vistos = self.token_repository.exists_many(t.pair_address for t in candidatos)
+        nuevos = [t for t in candidatos if t.pair_address not in vistos]
+        logger.debug("[discovery_controller] nuevos=%d", len(nuevos))
         return nuevos
 
-    def _filter_reasons(self, token: Token) -> list[str]:
-        reasons: list[str] = []
+    def evaluar_tokens(self, tokens: List[Token]) -> dict[str, list[str]]:
+        """
+        Criterios locales (liquidez y antigüedad) para todo el lote en una sola pasada,
+        sin I/O. Devuelve {pair_address: [motivos]}.
+        El predicado es sólo comparaciones numéricas contra umbrales precalculados;
+        los textos de motivo se formatean únicamente para los tokens que fallan.
+        """
+        now_ms = time.time_ns() // 1_000_000
+        # age_min < MIN_AGE_MIN  <=>  ts_ms > now_ms - MIN_AGE_MIN*60000 (sin dividir por token);
+        # Token.pair_created_at llega ya normalizado a milisegundos
+        created_cutoff_ms = now_ms - MIN_AGE_MIN * 60_000
+        result: dict[str, list[str]] = {}
+        for token in tokens:
+            reasons: list[str] = []
+            # liquidez mínima
+            try:
+                liq = float(getattr(token, "liquidity", 0.0) or 0.0)
+                if liq < MIN_LIQUIDITY_BNB:
+                    reasons.append(f"liquidez {liq:.4f} BNB < {MIN_LIQUIDITY_BNB:.4f} BNB")
+            except Exception:
+                pass
+
+            # antigüedad del par
+            try:
+                ts_ms = getattr(token, "pair_created_at", 0) or 0
+                if ts_ms > created_cutoff_ms:
+                    reasons.append(f"antigüedad {(now_ms - ts_ms) / 60_000:.1f}min < {MIN_AGE_MIN}min")
+            except Exception as e:
+                logger.debug("Error calculando antigüedad para %s: %s", token.symbol, e)
+
+            result[token.pair_address] = reasons
+        return result
+
+    def _filter_reasons(self, token: Token, local_reasons: list[str] | None = None) -> list[str]:
+        """
+        Todos los motivos de exclusión: liquidez/antigüedad (locales), honeypot vía GoPlus
+        y tasas guardadas (BD). Se recogen completos para el mensaje de Telegram.
+        """
+        # liquidez / antigüedad (precalculadas en lote por evaluar_tokens)
+        if local_reasons is None:
+            local_reasons = self.evaluar_tokens([token]).get(token.pair_address, [])
+        reasons: list[str] = list(local_reasons)
+
         # Honeypot + taxes desde GoPlus (y persiste tasas)
         try:
             is_honeypot = self.goplus.update_token_and_get_honeypot(token)
         except Exception as e:
-            logger.error(f"[filters] GoPlus error: {e}")
+            logger.error("[filters] GoPlus error: %s", e)
             is_honeypot = False
 
         if is_honeypot:
@@ -69,45 +112,57 @@ class DiscoveryController:
         if sell_tax > MAX_SELL_TAX_PCT: reasons.append(f"sell_tax {sell_tax:.2f}% > {MAX_SELL_TAX_PCT:.2f}%")
         if transfer_tax > MAX_TRANSFER_TAX: reasons.append(f"transfer_tax {transfer_tax:.2f}% > {MAX_TRANSFER_TAX:.2f}%")
 
-        # liquidez mínima
-        try:
-            liq = float(getattr(token, "liquidity", 0.0) or 0.0)
-            if liq < MIN_LIQUIDITY_BNB:
-                reasons.append(f"liquidez {liq:.4f} BNB < {MIN_LIQUIDITY_BNB:.4f} BNB")
-        except Exception:
-            pass
-
-        # antigüedad del par
-        try:
-            ts = float(getattr(token, "pair_created_at", 0) or 0)
-            if ts > 1e12:  # si es timestamp en milisegundos
-                ts = ts / 1000.0
-            age_min = (time.time() - ts) / 60.0
-            if age_min < MIN_AGE_MIN:
-                reasons.append(f"antigüedad {age_min:.1f}min < {MIN_AGE_MIN}min")
-        except Exception as e:
-            logger.debug(f"Error calculando antigüedad para {token.symbol}: {e}")
-
         return reasons
 
     @log_function
     def procesar_tokens_descubiertos(self) -> None:
         nuevos = self.buscar_pares_con_bnb()
-        for token in nuevos:
+        locales = self.evaluar_tokens(nuevos)
+        candidatos: List[Token] = []
+        # solicitudes por filtros del ciclo: se acumulan en el bucle y, al terminarlo, sale un mensaje por token
+        autorizaciones: list[tuple[Token, str]] = []
+        # GoPlus en lote antes del bucle: todos los tokens pasan por honeypot/tasas (también los
+        # que fallan en local, cuyo mensaje de autorización lleva esa información); después se lee de la caché
+        try:
+            self.goplus.batch_check([t.address for t in nuevos if getattr(t, "address", None)])
+        except Exception as e:
+            logger.error("[discovery_controller] GoPlus batch error: %s", e)
+        # todos los nuevos en una sola transacción
+        try:
+            self.token_repository.save_many(nuevos)
+        except Exception as e:
+            logger.error("[discovery_controller] error guardando tokens: %s", e)
+
+        def _pasan_filtros():
+            # 1) Filtros “duros”: cada token que pasa sale ya hacia autobuy (pool de hilos),
+            #    así sus RPC se solapan con el filtrado del resto del lote
+            for token in nuevos:
+                try:
+                    # los que fallan van a Telegram con el contexto completo
+                    # (honeypot y tasas incluidos) y las tasas quedan guardadas
+                    reasons = self._filter_reasons(token, locales.get(token.pair_address))
+                    if reasons:
+                        autorizaciones.append((token, "\n".join(reasons)))
+                        logger.debug("[discovery_controller] requiere autorización por filtros: %s", token.symbol)
+                        continue
+                    candidatos.append(token)
+                    yield token
+                except Exception as e:
+                    logger.error("[discovery_controller] error con %s: %s", getattr(token, 'pair_address', None), e)
+            # filtrado terminado: las autorizaciones salen mientras autobuy sigue con las propuestas
             try:
-                self.token_repository.save(token)
+                self.telegram.solicitar_autorizacion_lote(autorizaciones, tipo="compra")
+            except Exception as e:
+                logger.error("[discovery_controller] error enviando autorizaciones: %s", e)
 
-                # 1) Filtros “duros”
-                reasons = self._filter_reasons(token)
-                if reasons:
-                    self.telegram.solicitar_autorizacion(token, tipo="compra", contexto="\n".join(reasons))
-                    logger.debug(f"[discovery_controller] requiere autorización por filtros: {token.symbol}")
-                    continue
+        # 2) Pasan filtros → flujo de compra en paralelo (usa cap de gasto de prueba)
+        resultados = self.autobuy_controller.procesar_tokens(_pasan_filtros())
 
-                # 2) Pasa filtros → invocar flujo de compra
-                result = self.autobuy_controller.procesar_token(token)  # usa cap de gasto de prueba
+        for token in candidatos:
+            try:
+                result = resultados.get(token.pair_address)
                 if not result or not result.get("ok"):
-                    logger.debug(f"[discovery_controller] sin resultado compra: {token.symbol}")
+                    logger.debug("[discovery_controller] sin resultado compra: %s", token.symbol)
                     continue
 
                 mode = result.get("mode")
@@ -118,6 +173,6 @@ class DiscoveryController:
                 elif mode == "IMMEDIATE":
                     self.telegram.notificar_autorizado_info(token)
 
-                logger.debug(f"[discovery_controller] procesado {token.symbol} ({token.pair_address})")
+                logger.debug("[discovery_controller] procesado %s (%s)", token.symbol, token.pair_address)
             except Exception as e:
-                logger.error(f"[discovery_controller] error con {getattr(token,'pair_address',None)}: {e}")
+                logger.error("[discovery_controller] error con %s: %s", getattr(token, 'pair_address', None), e)
@@ -8,13 +8,19 @@ conditions are met. In this skeleton it provides a no‑op implementation.
 
 from __future__ import annotations
 
+import heapq
 import threading
 import time
 from models.token import Token
 from models.trade_session import TradeSession
 from repositories.monitor_repository import MonitorRepository
 from controllers.autosell_controller import AutosellController
-from utils.log_config import log_function
+from utils.log_config import logger_manager, log_function
+
+logger = logger_manager.setup_logger(__name__)
+
+# Espera entre el lanzamiento y la revisión de cada posición
+MONITOR_INTERVAL_SECS = 15.0
 
 
 class MonitorController:
@@ -24,24 +30,40 @@ class MonitorController:
         self.dry_run = dry_run
         self.repo = MonitorRepository()
         self.autosell_controller = AutosellController(dry_run=dry_run)
-        self.active_threads: dict[str, threading.Thread] = {}
+        # Un único hilo revisa todas las posiciones: cola (vencimiento, pair) + sesiones activas
+        self.active_sessions: dict[str, tuple[Token, TradeSession]] = {}
+        self._agenda: list[tuple[float, str]] = []
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
 
     @log_function
     def lanzar_monitor(self, token: Token, entry_price: float) -> None:
-        if token.pair_address in self.active_threads:
-            return
-
         session = TradeSession(token_address=token.pair_address, entry_price=entry_price)
+        with self._cond:
+            if token.pair_address in self.active_sessions:
+                return
+            self.active_sessions[token.pair_address] = (token, session)
+            heapq.heappush(self._agenda, (time.monotonic() + MONITOR_INTERVAL_SECS, token.pair_address))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._bucle_monitor, name="monitor", daemon=True)
+                self._thread.start()
+            self._cond.notify()
 
-        thread = threading.Thread(target=self._ejecutar_monitor, args=(token, session))
-        thread.daemon = True
-        thread.start()
+    def _bucle_monitor(self) -> None:
+        while True:
+            with self._cond:
+                while not self._agenda or self._agenda[0][0] > time.monotonic():
+                    self._cond.wait(self._agenda[0][0] - time.monotonic() if self._agenda else None)
+                _, pair = heapq.heappop(self._agenda)
+                token, session = self.active_sessions[pair]
+            try:
+                self._ejecutar_monitor(token, session)
+            except Exception as e:
+                logger.error("[monitor] error con %s: %s", pair, e)
+            finally:
+                with self._cond:
+                    self.active_sessions.pop(pair, None)
 
-        self.active_threads[token.pair_address] = thread
-        
     def _ejecutar_monitor(self, token: Token, session: TradeSession):
-        while True:
-            time.sleep(15)
-            self.repo.save_state(token, session)
-            self.autosell_controller.procesar_venta(token, session)
-            break
+        self.repo.save_state(token, session)
+        self.autosell_controller.procesar_venta(token, session)
@@ -1,23 +1,25 @@
-import os
 from utils.log_config import logger_manager, log_function
-from services.web3_service import Web3Service
+from services.web3_service import get_web3_service, DEFAULT_SLIPPAGE, WBNB_ADDRESS as _WBNB_ENV
+from web3 import Web3
 from web3.exceptions import ContractLogicError
 
 logger = logger_manager.setup_logger(__name__)
-DEFAULT_SLIPPAGE = float(os.getenv("DEFAULT_SLIPPAGE", "3.0"))
+# mismo valor (y default) que usa Web3Service; checksum una vez al importar
+WBNB_ADDRESS = Web3.to_checksum_address(_WBNB_ENV)
 
 class Web3Controller:
     def __init__(self):
-        self.web3_service = Web3Service()
+        self.web3_service = get_web3_service()
         self.slippage = DEFAULT_SLIPPAGE
 
     @log_function
     def get_amount_out_min(self, amount_bnb_wei: int, token_address: str) -> int | None:
         try:
-            path = [os.getenv("WBNB_ADDRESS"), token_address]
-            return self.web3_service.get_amount_out_min(amount_bnb_wei, path, self.slippage)
+            # getAmountsOut + decimals() en un único eth_call (Multicall3), con la caché de cotizaciones
+            amount_out_min, _ = self.web3_service.quote_buy(amount_bnb_wei, token_address, self.slippage)
+            return amount_out_min
         except ContractLogicError as e:
-            logger.error(f"Error en getAmountsOut: {e}")
+            logger.error("Error en getAmountsOut: %s", e)
             return None
 
     @log_function
@@ -27,7 +29,7 @@ class Web3Controller:
             logger.warning("amountOutMin inválido; cancelando preview")
             return None
         return {
-            "path": [os.getenv("WBNB_ADDRESS"), token_address],
+            "path": [WBNB_ADDRESS, token_address],
             "amount_in_wei": int(amount_bnb_wei),
             "amount_out_min": int(aomin),
             "slippage_percent": float(self.slippage),
@@ -38,4 +40,5 @@ class Web3Controller:
         aomin = self.get_amount_out_min(amount_bnb_wei, token_address)
         if not aomin or aomin <= 0:
             return None
-        return self.web3_service.build_swap_exact_eth_for_tokens(amount_bnb_wei, aomin, token_address)
+        # cotización > 0 implica que el par existe: sin getPair extra
+        return self.web3_service.build_swap_exact_eth_for_tokens(amount_bnb_wei, aomin, token_address, check_pool=False)
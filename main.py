@@ -1,6 +1,8 @@
 # ---------- VALIDACIÓN DE ENTORNO (PEGAR ARRIBA EN main.py) ----------
 from __future__ import annotations
 import os, sys, re, requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from utils.log_config import logger_manager
 
 vlog = logger_manager.setup_logger("env_validator")
@@ -48,6 +50,10 @@ OPTIONAL_ENV_BOOLS = [
 
 _ADDR_RE = re.compile(r"^0x[a-fA-F0-9]{40}$")
 _PRIV_RE = re.compile(r"^(0x)?[a-fA-F0-9]{64}$")
+_ADDR_MATCH = _ADDR_RE.match
+_PRIV_MATCH = _PRIV_RE.match
+_TRUE = frozenset(("1", "true", "yes", "y", "on"))
+_FALSE = frozenset(("0", "false", "no", "n", "off"))
 
 def _env(name: str, default: str | None = None) -> str | None:
     v = os.getenv(name, default if default is not None else None)
@@ -56,16 +62,14 @@ def _env(name: str, default: str | None = None) -> str | None:
 def _boolish(val: str | None) -> bool | None:
     if val is None: return None
     s = val.lower()
-    if s in ("1","true","yes","y","on"): return True
-    if s in ("0","false","no","n","off"): return False
-    return None
+    return True if s in _TRUE else False if s in _FALSE else None
 
 def _check_addr(name: str, val: str | None, errs: list[str]) -> None:
-    if not val or not _ADDR_RE.match(val):
+    if not val or not _ADDR_MATCH(val):
         errs.append(f"{name} debe ser dirección EVM válida (0x + 40 hex). Valor='{val}'")
 
 def _check_priv(name: str, val: str | None, errs: list[str]) -> None:
-    if not val or not _PRIV_RE.match(val):
+    if not val or not _PRIV_MATCH(val):
         preview = (val[:6] + "…" + val[-4:]) if val and len(val) > 12 else str(val)
         errs.append(f"{name} debe ser clave privada hex de 64 chars (con o sin 0x). Valor='{preview}'")
 
@@ -87,9 +91,18 @@ def _check_int_min0(name: str, val: str | None, errs: list[str]) -> None:
     except Exception:
         errs.append(f"{name} debe ser entero. Valor='{val}'")
 
+# Sesión keep-alive para las consultas JSON-RPC de validación; eth_chainId es idempotente,
+# así que se reintenta también el POST ante errores 5xx de gateway
+_rpc_session = requests.Session()
+_rpc_session.mount("https://", HTTPAdapter(
+    pool_connections=4, pool_maxsize=8,
+    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504],
+                      allowed_methods=frozenset({"POST"})),
+))
+
 def _rpc_chain_id(rpc_url: str, timeout: float = 6.0) -> int | None:
     try:
-        r = requests.post(
+        r = _rpc_session.post(
             rpc_url,
             json={"jsonrpc":"2.0","id":1,"method":"eth_chainId","params":[]},
             timeout=timeout
@@ -107,44 +120,45 @@ def _rpc_chain_id(rpc_url: str, timeout: float = 6.0) -> int | None:
 
 def validate_env_or_die() -> None:
     errs: list[str] = []
+    # una sola lectura (y strip) por variable; el resto de pasos consultan este dict
+    env = {
+        name: _env(name)
+        for name in (*REQUIRED_ENV, *OPTIONAL_ENV_FLOATS_MIN0, *OPTIONAL_ENV_INTS_MIN0, *OPTIONAL_ENV_BOOLS)
+    }
 
     # 1) Faltantes hard
     for name in REQUIRED_ENV:
-        if not _env(name):
+        if not env[name]:
             errs.append(f"Falta variable obligatoria: {name}")
 
     # 2) Formatos duros
-    _check_addr("WALLET_ADDRESS", _env("WALLET_ADDRESS"), errs)
-    _check_addr("ROUTER_ADDRESS", _env("ROUTER_ADDRESS"), errs)
-    _check_addr("WBNB_ADDRESS", _env("WBNB_ADDRESS"), errs)
-    _check_priv("PRIVATE_KEY", _env("PRIVATE_KEY"), errs)
+    _check_addr("WALLET_ADDRESS", env["WALLET_ADDRESS"], errs)
+    _check_addr("ROUTER_ADDRESS", env["ROUTER_ADDRESS"], errs)
+    _check_addr("WBNB_ADDRESS", env["WBNB_ADDRESS"], errs)
+    _check_priv("PRIVATE_KEY", env["PRIVATE_KEY"], errs)
 
-    # 3) CHAIN_ID entero > 0
+    # 3) CHAIN_ID entero > 0 (se reutiliza en el ping RPC)
+    want_cid = None
     try:
-        cid = int(_env("CHAIN_ID","0") or "0")
-        if cid <= 0: errs.append("CHAIN_ID debe ser entero > 0.")
+        want_cid = int(env["CHAIN_ID"] or "0")
+        if want_cid <= 0: errs.append("CHAIN_ID debe ser entero > 0.")
     except Exception:
-        errs.append(f"CHAIN_ID debe ser entero. Valor='{_env('CHAIN_ID')}'")
+        errs.append(f"CHAIN_ID debe ser entero. Valor='{env['CHAIN_ID']}'")
 
     # 4) Floats e ints opcionales
     for name in OPTIONAL_ENV_FLOATS_MIN0:
-        _check_float_min0(name, _env(name), errs)
+        _check_float_min0(name, env[name], errs)
     for name in OPTIONAL_ENV_INTS_MIN0:
-        _check_int_min0(name, _env(name), errs)
+        _check_int_min0(name, env[name], errs)
 
     # 5) Booleans opcionales
     for name in OPTIONAL_ENV_BOOLS:
-        b = _boolish(_env(name))
-        if b is None and _env(name) is not None:
-            errs.append(f"{name} debe ser booleano (true/false). Valor='{_env(name)}'")
+        val = env[name]
+        if _boolish(val) is None and val is not None:
+            errs.append(f"{name} debe ser booleano (true/false). Valor='{val}'")
 
     # 6) Ping RPC + verificación de CHAIN_ID
-    rpc = _env("RPC_URL")
-    want_cid = None
-    try:
-        want_cid = int(_env("CHAIN_ID","0") or "0")
-    except Exception:
-        pass
+    rpc = env["RPC_URL"]
     got_cid = _rpc_chain_id(rpc) if rpc else None
     if got_cid is None:
         errs.append(f"No se pudo consultar eth_chainId en RPC_URL='{rpc}'")
@@ -159,20 +173,20 @@ def validate_env_or_die() -> None:
         sys.exit(1)
 
     # 8) Información útil
-    pk = _env("PRIVATE_KEY") or ""
+    pk = env["PRIVATE_KEY"] or ""
     masked_pk = (pk[:6] + "…" + pk[-4:]) if len(pk) > 12 else pk
     vlog.info("✅ Entorno validado.")
-    vlog.info(f"DB_PATH={_env('DB_PATH')} | RPC_URL={_env('RPC_URL')} | CHAIN_ID={_env('CHAIN_ID')}")
-    vlog.info(f"WALLET_ADDRESS={_env('WALLET_ADDRESS')} | PRIVATE_KEY={masked_pk}")
-    vlog.info(f"ROUTER_ADDRESS={_env('ROUTER_ADDRESS')} | WBNB_ADDRESS={_env('WBNB_ADDRESS')}")
-    vlog.info(f"TELEGRAM_CHAT_ID={_env('TELEGRAM_CHAT_ID')}")
+    vlog.info(f"DB_PATH={env['DB_PATH']} | RPC_URL={env['RPC_URL']} | CHAIN_ID={env['CHAIN_ID']}")
+    vlog.info(f"WALLET_ADDRESS={env['WALLET_ADDRESS']} | PRIVATE_KEY={masked_pk}")
+    vlog.info(f"ROUTER_ADDRESS={env['ROUTER_ADDRESS']} | WBNB_ADDRESS={env['WBNB_ADDRESS']}")
+    vlog.info(f"TELEGRAM_CHAT_ID={env['TELEGRAM_CHAT_ID']}")
     # extras (si están definidos)
-    if _env("GAS_PRICE_WEI") not in (None, "", "0"):
-        vlog.info(f"GAS_PRICE_WEI={_env('GAS_PRICE_WEI')}")
-    if _env("DRY_RUN"):
-        vlog.info(f"DRY_RUN={_env('DRY_RUN')}")
-    if _env("LOG_TELEGRAM_ERRORS"):
-        vlog.info(f"LOG_TELEGRAM_ERRORS={_env('LOG_TELEGRAM_ERRORS')}")
+    if env["GAS_PRICE_WEI"] not in (None, "", "0"):
+        vlog.info(f"GAS_PRICE_WEI={env['GAS_PRICE_WEI']}")
+    if env["DRY_RUN"]:
+        vlog.info(f"DRY_RUN={env['DRY_RUN']}")
+    if env["LOG_TELEGRAM_ERRORS"]:
+        vlog.info(f"LOG_TELEGRAM_ERRORS={env['LOG_TELEGRAM_ERRORS']}")
 # ---------- FIN VALIDACIÓN DE ENTORNO ----------
 
 import time
@@ -194,6 +208,7 @@ from orchestrators.monitor_orchestrator import MonitorOrchestrator
 from orchestrators.discovery_orchestrator import DiscoveryOrchestrator
 
 from services.telegram_bot import TelegramBot
+from services.telegram_service import flush_telegram_service
 from utils.log_config import logger_manager
 
 logger = logger_manager.setup_logger(__name__)
@@ -208,9 +223,11 @@ STREAMLIT_PORT = os.getenv("STREAMLIT_PORT", "8501")
 
 # Plan de compra por defecto (puedes afinarlo por ENV)
 DEFAULT_BUY_BNB = float(os.getenv("DEFAULT_BUY_BNB", "0.02"))  # 0.02 BNB
+_DEFAULT_BUY_WEI = int(DEFAULT_BUY_BNB * 1e18)
 def plan_fn(pair_address: str) -> Dict[str, Any]:
     """Devuelve el plan de compra para un par. Puedes sofisticarlo después."""
-    return {"amount_bnb_wei": int(DEFAULT_BUY_BNB * 1e18)}
+    # dict nuevo por llamada: el llamador puede ajustarlo sin tocar el de otros pares
+    return {"amount_bnb_wei": _DEFAULT_BUY_WEI}
 
 # ------------------------------
 # Lanzadores
@@ -224,9 +241,8 @@ def start_orchestrator(stop_event: threading.Event):
     # guardamos referencia para poder pararlo desde el manejador de señales
     start_orchestrator.instance = orch  # type: ignore[attr-defined]
     orch.start()
-    # esperar hasta que nos pidan parar
-    while not stop_event.is_set():
-        time.sleep(0.5)
+    # esperar (bloqueado, sin sondeo) hasta que nos pidan parar
+    stop_event.wait()
     # parada suave
     try:
         orch.stop()
@@ -239,6 +255,7 @@ def start_telegram_bot(stop_event: threading.Event):
     Desactiva signal handlers (solo válidos en el hilo principal).
     """
     start_telegram_bot.instance = None  # será asignado dentro del hilo
+    instance_ready = threading.Event()
 
     def _run():
         import asyncio, platform
@@ -253,12 +270,14 @@ def start_telegram_bot(stop_event: threading.Event):
             from services.telegram_bot import TelegramBot
             bot = TelegramBot()
             start_telegram_bot.instance = bot  # para poder pararlo desde fuera
+            instance_ready.set()
 
             # run_polling en este hilo, sin instalar signal handlers
             bot.application.run_polling(stop_signals=None, close_loop=False)
         except Exception as e:
             logger.error(f"Fallo en TelegramBot: {e}")
         finally:
+            instance_ready.set()  # sin instancia: que la parada no espere en balde
             try:
                 loop.stop()
             except Exception:
@@ -272,16 +291,12 @@ def start_telegram_bot(stop_event: threading.Event):
     t.start()
 
     # Esperar solicitud de parada global
-    while not stop_event.is_set():
-        time.sleep(0.5)
+    stop_event.wait()
 
     # Parada suave del bot cuando exista la instancia
     try:
-        for _ in range(50):  # esperar hasta 5s a que se cree la instancia
-            bot = getattr(start_telegram_bot, "instance", None)
-            if bot is not None:
-                break
-            time.sleep(0.1)
+        instance_ready.wait(timeout=5.0)  # hasta 5s a que se cree la instancia
+        bot = getattr(start_telegram_bot, "instance", None)
         if bot is not None:
             bot.stop_running()  # hace que run_polling() termine
     except Exception as e:
@@ -291,8 +306,7 @@ def start_discovery(stop_event: threading.Event):
     disc = DiscoveryOrchestrator()
     start_discovery.instance = disc  # type: ignore[attr-defined]
     disc.start()
-    while not stop_event.is_set():
-        time.sleep(0.5)
+    stop_event.wait()
     try:
         disc.stop()
     except Exception as e:
@@ -345,6 +359,11 @@ def shutdown(*_):
                 streamlit_proc.kill()
         except Exception as e:
             logger.error(f"No se pudo cerrar Streamlit: {e}")
+    # mensajes aún en cola (p. ej. la última alerta de venta): el hilo emisor es daemon
+    try:
+        flush_telegram_service()
+    except Exception as e:
+        logger.error(f"No se pudo vaciar la cola de Telegram: {e}")
     logger.info("✅ Apagado completado.")
 
 signal.signal(signal.SIGINT, shutdown)
@@ -374,14 +393,18 @@ if __name__ == "__main__":
     streamlit_proc = start_streamlit_process()
 
     # 5) Espera bloqueante hasta que streamlit termine o llegue señal
+    def _watch_streamlit(proc: subprocess.Popen) -> None:
+        # si streamlit muere solo, paramos todo
+        proc.wait()
+        if not stop_all_evt.is_set():
+            logger.warning("El proceso de Streamlit finalizó. Cerrando servicios...")
+            stop_all_evt.set()
+
+    threading.Thread(target=_watch_streamlit, args=(streamlit_proc,), name="StreamlitWatch", daemon=True).start()
     try:
-        while not stop_all_evt.is_set():
-            # si streamlit muere solo, paramos todo
-            if streamlit_proc and streamlit_proc.poll() is not None:
-                logger.warning("El proceso de Streamlit finalizó. Cerrando servicios...")
-                stop_all_evt.set()
-                break
-            time.sleep(0.5)
+        # wait() con timeout: en algunos sistemas un wait() sin límite no deja pasar Ctrl+C
+        while not stop_all_evt.wait(timeout=60):
+            pass
     finally:
         shutdown()
         # dar un poco de tiempo a los hilos a cerrarse bien
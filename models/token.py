@@ -8,10 +8,19 @@ symbol, liquidity, etc.).
 
 from __future__ import annotations
 
-from pydantic import BaseModel
+from pydantic import BaseModel, field_validator
 import time
 
 
+# sentinela de sólo lectura para sub-objetos ausentes en la respuesta de DexScreener
+_EMPTY: dict = {}
+
+
+def _to_ms(v: int) -> int:
+    # siempre en milisegundos (unidad de DexScreener); un timestamp en segundos se escala
+    return v * 1000 if 0 < v < 10**12 else v
+
+
 class Token(BaseModel):
     
     pair_address: str
@@ -32,22 +41,32 @@ class Token(BaseModel):
     status: str = ""  # Default status
     timestamp: int = int(time.time())
 
+    @field_validator("pair_created_at")
+    @classmethod
+    def _created_at_ms(cls, v: int) -> int:
+        return _to_ms(v)
+
     @classmethod
     def from_dexscreener(cls, raw: dict) -> "Token":
-        base = raw.get("baseToken", {})
-        return cls(
-            pair_address=raw.get("pairAddress", ""),
-            name=base.get("name", ""),
-            symbol=base.get("symbol", ""),
-            address=base.get("address", ""),
-            price_native=float(raw.get("priceNative", 0)),
-            price_usd=float(raw.get("priceUsd", 0)),
-            pair_created_at=int(raw.get("pairCreatedAt", 0)),
-            liquidity=float(raw.get("liquidity", 0).get("base", 0)),
-            volume=float(raw.get("volume", 0).get("h24", 0)),
-            buys=int(raw.get("txns", 0).get("h1", 0).get("buys", 0)),
-            image_url=raw.get("info", {}).get("imageUrl", ""),
-            open_graph=raw.get("url", ""),
+        # los valores ya salen convertidos (float/int/str) de aquí: model_construct se ahorra
+        # la validación campo a campo de pydantic; el validador de pair_created_at se aplica a mano
+        # claves ausentes o null -> _EMPTY compartido (sin dict nuevo por cada .get fallido)
+        get = raw.get
+        base = get("baseToken") or _EMPTY
+        txns_h1 = (get("txns") or _EMPTY).get("h1") or _EMPTY
+        return cls.model_construct(
+            pair_address=get("pairAddress") or "",
+            name=base.get("name") or "",
+            symbol=base.get("symbol") or "",
+            address=base.get("address") or "",
+            price_native=float(get("priceNative") or 0.0),
+            price_usd=float(get("priceUsd") or 0.0),
+            pair_created_at=_to_ms(int(get("pairCreatedAt") or 0)),
+            liquidity=float((get("liquidity") or _EMPTY).get("base") or 0.0),
+            volume=float((get("volume") or _EMPTY).get("h24") or 0.0),
+            buys=int(txns_h1.get("buys") or 0),
+            image_url=(get("info") or _EMPTY).get("imageUrl") or "",
+            open_graph=get("url") or "",
             timestamp=int(time.time())
         )
     
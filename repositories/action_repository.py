@@ -1,6 +1,7 @@
-import sqlite3, os
+import os
 from pathlib import Path
 from utils.log_config import log_function
+from utils.db_pool import get_conn
 
 def _resolve_db_path() -> str:
     env_path = os.getenv("DB_PATH")
@@ -13,15 +14,27 @@ def _resolve_db_path() -> str:
 
 DB_PATH = _resolve_db_path()
 
+# Texto SQL fijo a nivel de módulo: sqlite3 cachea la sentencia preparada por conexión
+# (y las conexiones del pool se reutilizan), así que sólo se compila la primera vez
+_REGISTRAR_SQL = """
+    INSERT INTO acciones (pair_address, tipo, estado, timestamp, notified_at, token_address, motivo)
+    VALUES (?, ?, 'pendiente', strftime('%s','now'), NULL, ?, ?)
+    ON CONFLICT(pair_address) DO UPDATE SET
+        tipo=excluded.tipo,
+        estado='pendiente',
+        timestamp=strftime('%s','now'),
+        notified_at=NULL,
+        token_address=COALESCE(excluded.token_address, acciones.token_address),
+        motivo=COALESCE(excluded.motivo, acciones.motivo)
+"""
+
 class ActionRepository:
     def __init__(self, db_path: str | None = None):
         self.db_path = str(Path(db_path).expanduser().resolve()) if db_path else DB_PATH
         self._create_table()
 
     def _connect(self):
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return get_conn(self.db_path)
 
     def _create_table(self):
         with self._connect() as conn:
@@ -51,17 +64,19 @@ class ActionRepository:
                          token_address: str | None = None,
                          motivo: str | None = None):
         with self._connect() as conn:
-            conn.execute("""
-                INSERT INTO acciones (pair_address, tipo, estado, timestamp, notified_at, token_address, motivo)
-                VALUES (?, ?, 'pendiente', strftime('%s','now'), NULL, ?, ?)
-                ON CONFLICT(pair_address) DO UPDATE SET
-                    tipo=excluded.tipo,
-                    estado='pendiente',
-                    timestamp=strftime('%s','now'),
-                    notified_at=NULL,
-                    token_address=COALESCE(excluded.token_address, acciones.token_address),
-                    motivo=COALESCE(excluded.motivo, acciones.motivo)
-            """, (pair_address, tipo, token_address, motivo))
+            conn.execute(_REGISTRAR_SQL, (pair_address, tipo, token_address, motivo))
+            conn.commit()
+
+    @log_function
+    def registrar_acciones(self, acciones: list[tuple[str, str, str | None, str | None]]):
+        """
+        Igual que registrar_accion para varias (pair_address, tipo, token_address, motivo)
+        en una sola transacción: un commit por lote en vez de uno por par.
+        """
+        if not acciones:
+            return
+        with self._connect() as conn:
+            conn.executemany(_REGISTRAR_SQL, acciones)
             conn.commit()
 
     @log_function
@@ -94,7 +109,7 @@ class ActionRepository:
             conn.execute('DELETE FROM acciones WHERE pair_address=?', (pair_address,))
             conn.commit()
 
-    @log_function
+    @log_function(sample_rate=20)  # sondeado en bucle por monitor/bot
     def list_all(self, estado: str | None = None, limit: int = 50) -> list[dict]:
         q = "SELECT pair_address,tipo,estado,timestamp,notified_at,token_address,motivo FROM acciones"
         p: list = []
@@ -108,7 +123,7 @@ class ActionRepository:
             cols = [d[0] for d in cur.description]
             return [dict(zip(cols, r)) for r in cur.fetchall()]
 
-    @log_function
+    @log_function(sample_rate=20)  # sondeado en bucle por monitor/bot
     def list_pending_not_notified(self, limit: int = 20) -> list[dict]:
         with self._connect() as conn:
             cur = conn.execute("""
@@ -1,19 +1,17 @@
 from __future__ import annotations
 import os, sqlite3
-from contextlib import contextmanager
 from typing import Any, Optional
 
+from utils.db_pool import get_conn
+
 DB_PATH = os.path.join(os.path.dirname(__file__), "../../memecoins.db")
 
 class HistoryRepository:
     def __init__(self, db_path: str = DB_PATH)->None:
         self.db_path=db_path; self._ensure_table()
 
-    @contextmanager
     def _conn(self):
-        conn=sqlite3.connect(self.db_path); conn.row_factory=sqlite3.Row
-        try: yield conn
-        finally: conn.close()
+        return get_conn(self.db_path)
 
     def _ensure_table(self)->None:
         with self._conn() as c:
@@ -29,18 +27,26 @@ class HistoryRepository:
             c.commit()
 
     def create_buy(self, pair_address:str, token_address:str, symbol:str|None, name:str|None,
-                   buy_entry_price:float|None, buy_price_with_fees:float|None, buy_date_ts:int)->int:
-        with self._conn() as c:
-            cur=c.execute("""INSERT INTO history(
+                   buy_entry_price:float|None, buy_price_with_fees:float|None, buy_date_ts:int,
+                   conn:sqlite3.Connection|None=None)->int:
+        """Con conn (utils.db.transaction) no hace commit: lo hace quien abrió la transacción."""
+        sql="""INSERT INTO history(
                 pair_address,token_address,symbol,name,buy_entry_price,buy_price_with_fees,buy_date)
-                VALUES(?,?,?,?,?,?,?)""",
-                (pair_address,token_address,symbol,name,buy_entry_price,buy_price_with_fees,buy_date_ts))
+                VALUES(?,?,?,?,?,?,?)"""
+        params=(pair_address,token_address,symbol,name,buy_entry_price,buy_price_with_fees,buy_date_ts)
+        if conn is not None:
+            return int(conn.execute(sql, params).lastrowid)
+        with self._conn() as c:
+            cur=c.execute(sql, params)
             c.commit(); return int(cur.lastrowid)
 
-    def set_buy_final_result(self, history_id:int, buy_real_price:float, buy_amount:float)->None:
+    def set_buy_final_result(self, history_id:int, buy_real_price:float, buy_amount:float,
+                             conn:sqlite3.Connection|None=None)->None:
+        sql="UPDATE history SET buy_real_price=?, buy_amount=? WHERE id=?"
+        if conn is not None:
+            conn.execute(sql, (buy_real_price,buy_amount,history_id)); return
         with self._conn() as c:
-            c.execute("UPDATE history SET buy_real_price=?, buy_amount=? WHERE id=?",
-                      (buy_real_price,buy_amount,history_id)); c.commit()
+            c.execute(sql, (buy_real_price,buy_amount,history_id)); c.commit()
 
     def finalize_sell(self, history_id:int, sell_entry_price:float|None, sell_price_with_fees:float|None,
                       sell_real_price:float, sell_amount:float, pnl:float, bnb_amount:float,
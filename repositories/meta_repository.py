@@ -1,6 +1,7 @@
-import sqlite3
 import os
 
+from utils.db_pool import get_conn
+
 DB_PATH = os.getenv("DB_PATH", "./data/memecoins.db")
 
 class MetaRepository:
@@ -9,7 +10,7 @@ class MetaRepository:
         self._ensure()
 
     def _conn(self):
-        return sqlite3.connect(self.db_path)
+        return get_conn(self.db_path)
 
     def _ensure(self):
         with self._conn() as c:
@@ -1,16 +1,24 @@
-import sqlite3, os
+import os, sqlite3, threading
 from models.token import Token
 from models.trade_session import TradeSession
 from utils.log_config import log_function
+from utils.db_pool import get_conn
 
 DB_PATH = os.path.join(os.path.dirname(__file__), "../../memecoins.db")
 
 class MonitorRepository:
+    # pair_address -> history_id por fichero de BD, compartido entre instancias del proceso
+    # (autobuy y autosell crean la suya). Write-through: SQLite sigue siendo la fuente de verdad.
+    _history_ids: dict[str, dict[str, int | None]] = {}
+    _history_lock = threading.Lock()
+
     def __init__(self, db_path: str = DB_PATH):
         self.db_path=db_path; self._ensure_table(); self._ensure_history_id_column()
+        with self._history_lock:
+            self._hist=self._history_ids.setdefault(os.path.abspath(db_path), {})
 
     def _connect(self):
-        conn=sqlite3.connect(self.db_path); conn.row_factory=sqlite3.Row; return conn
+        return get_conn(self.db_path)
 
     def _ensure_table(self):
         with self._connect() as conn:
@@ -26,7 +34,10 @@ class MonitorRepository:
             cols={r[1] for r in conn.execute("PRAGMA table_info(monitor_state)").fetchall()}
             if "history_id" not in cols:
                 conn.execute("ALTER TABLE monitor_state ADD COLUMN history_id INTEGER")
-                conn.commit()
+            # copia de history.buy_real_price: el cierre de venta la lee sin ir a history
+            if "buy_real_price" not in cols:
+                conn.execute("ALTER TABLE monitor_state ADD COLUMN buy_real_price REAL")
+            conn.commit()
 
     @log_function
     def save_state(self, token: Token, session: TradeSession):
@@ -50,25 +61,70 @@ class MonitorRepository:
             conn.commit()
 
     @log_function
-    def set_history_id(self, pair_address: str, history_id: int):
-        with self._connect() as conn:
-            conn.execute('''INSERT INTO monitor_state(pair_address,history_id,updated_at)
-                            VALUES(?, ?, strftime('%s','now'))
-                            ON CONFLICT(pair_address) DO UPDATE SET history_id=excluded.history_id''',
-                         (pair_address,history_id))
-            conn.commit()
+    def set_history_id(self, pair_address: str, history_id: int, conn: sqlite3.Connection | None = None):
+        sql='''INSERT INTO monitor_state(pair_address,history_id,updated_at)
+                 VALUES(?, ?, strftime('%s','now'))
+                 ON CONFLICT(pair_address) DO UPDATE SET history_id=excluded.history_id, buy_real_price=NULL'''
+        if conn is not None:
+            # dentro de una transacción ajena: la caché no se toca hasta el commit;
+            # el llamador la actualiza con cache_history_id al salir de transaction()
+            conn.execute(sql,(pair_address,history_id))
+            return
+        with self._connect() as c:
+            c.execute(sql,(pair_address,history_id))
+            c.commit()
+        self.cache_history_id(pair_address, history_id)
+
+    def cache_history_id(self, pair_address: str, history_id: int | None):
+        with self._history_lock:
+            self._hist[pair_address]=history_id
 
     @log_function
     def get_history_id(self, pair_address:str)->int|None:
+        with self._history_lock:
+            if pair_address in self._hist:
+                return self._hist[pair_address]
         with self._connect() as conn:
             row=conn.execute("SELECT history_id FROM monitor_state WHERE pair_address=?",(pair_address,)).fetchone()
-            return int(row[0]) if row and row[0] is not None else None
+            history_id=int(row[0]) if row and row[0] is not None else None
+        if history_id is not None:
+            with self._history_lock:
+                self._hist.setdefault(pair_address, history_id)
+        return history_id
+
+    @log_function
+    def set_buy_real_price(self, pair_address: str, buy_real_price: float, conn: sqlite3.Connection | None = None):
+        sql="UPDATE monitor_state SET buy_real_price=? WHERE pair_address=?"
+        if conn is not None:
+            conn.execute(sql,(buy_real_price,pair_address))
+            return
+        with self._connect() as c:
+            c.execute(sql,(buy_real_price,pair_address))
+            c.commit()
+
+    @log_function
+    def get_position(self, pair_address:str)->tuple[int, float | None] | None:
+        """
+        (history_id, buy_real_price) del par en una sola lectura de monitor_state.
+        Filas anteriores a la columna buy_real_price caen a history (COALESCE sólo evalúa
+        la subconsulta si el valor local es NULL).
+        """
+        with self._connect() as conn:
+            row=conn.execute("""SELECT m.history_id,
+                                       COALESCE(m.buy_real_price,
+                                                (SELECT h.buy_real_price FROM history h WHERE h.id=m.history_id))
+                                FROM monitor_state m WHERE m.pair_address=?""",(pair_address,)).fetchone()
+        if not row or row[0] is None:
+            return None
+        return int(row[0]), (float(row[1]) if row[1] is not None else None)
 
     @log_function
     def clear_history_id(self, pair_address:str):
         with self._connect() as conn:
-            conn.execute("UPDATE monitor_state SET history_id=NULL WHERE pair_address=?", (pair_address,))
+            conn.execute("UPDATE monitor_state SET history_id=NULL, buy_real_price=NULL WHERE pair_address=?", (pair_address,))
             conn.commit()
+        with self._history_lock:
+            self._hist[pair_address]=None
 
     @log_function
     def list_monitored(self, limit:int=50)->list[dict]:
@@ -34,6 +34,8 @@ class DiscoveryService:
         # muy importante el "*": capta pares con BNB/WBNB como referencia (no solo que contengan "BNB" en el símbolo)
         self.query = (query or os.getenv("DISCOVERY_QUERY") or "*/BNB").strip()
         self.chain_name = _CHAIN_MAP.get(str(chain_id or os.getenv("CHAIN_ID", "56")), "bsc")
+        # keep-alive con Dexscreener: cada ciclo reutiliza la conexión TLS en vez de abrir otra
+        self._http = requests.Session()
 
     @property
     def url(self) -> str:
@@ -43,7 +45,7 @@ class DiscoveryService:
     def discover_new_tokens(self) -> List[Token]:
         logger.debug(f"[discovery] GET {self.url} (chain={self.chain_name})")
         try:
-            r = requests.get(self.url, timeout=12)
+            r = self._http.get(self.url, timeout=12)
             r.raise_for_status()
             data = r.json() or {}
             pairs = data.get("pairs", []) or []
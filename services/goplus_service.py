@@ -3,9 +3,18 @@ from __future__ import annotations
 import os
 from goplus.token import Token as GoPlusToken
 from utils.logger import logger_manager, log_function
+from utils.ttl_cache import TTLCache
 
 logger = logger_manager.setup_logger(__name__)
 
+# El resultado de GoPlus para una dirección es estable durante minutos y un mismo token
+# reaparece entre ciclos de discovery: se cachea por dirección para no repetir la llamada.
+GOPLUS_CACHE_TTL = float(os.getenv("GOPLUS_CACHE_TTL", "600"))
+GOPLUS_CACHE_MAX = int(os.getenv("GOPLUS_CACHE_MAX", "10000"))
+_TOKEN_DATA_CACHE: TTLCache[dict] = TTLCache(maxsize=GOPLUS_CACHE_MAX, ttl=GOPLUS_CACHE_TTL)
+# token_security admite varias direcciones separadas por coma por petición
+GOPLUS_BATCH_SIZE = int(os.getenv("GOPLUS_BATCH_SIZE", "100"))
+
 class GoplusService:
     """
     Servicio para consultar datos de seguridad de tokens usando el SDK oficial de GoPlus.
@@ -21,7 +30,54 @@ class GoplusService:
     def get_token_data(self, token) -> dict:
         """
         Llama a la API de GoPlus y devuelve el nodo de datos del token como dict.
+        Las respuestas no vacías se cachean GOPLUS_CACHE_TTL segundos por dirección.
+        """
+        token_addr_lower = token.address.lower()
+        cached = _TOKEN_DATA_CACHE.get(token_addr_lower)
+        if cached is not None:
+            return cached
+
+        data = self._fetch_token_data(token, token_addr_lower)
+        if data:
+            _TOKEN_DATA_CACHE.set(token_addr_lower, data)
+        return data
+
+    @log_function
+    def batch_check(self, addresses: list[str]) -> dict[str, dict]:
+        """
+        Consulta en lote (GOPLUS_BATCH_SIZE direcciones por petición) las que no estén en caché
+        y las deja cacheadas, de modo que get_token_data posterior no sale a red.
+        Devuelve {dirección en minúsculas: nodo de datos} para las direcciones con respuesta.
         """
+        result: dict[str, dict] = {}
+        pending: list[str] = []
+        for addr in dict.fromkeys(a.lower() for a in addresses if a):
+            cached = _TOKEN_DATA_CACHE.get(addr)
+            if cached is not None:
+                result[addr] = cached
+            else:
+                pending.append(addr)
+
+        for i in range(0, len(pending), GOPLUS_BATCH_SIZE):
+            chunk = pending[i:i + GOPLUS_BATCH_SIZE]
+            try:
+                resp = self.client.token_security(
+                    chain_id="56",  # BSC mainnet
+                    addresses=chunk,
+                    **{"_request_timeout": 10}
+                )
+                nodes = resp.result if isinstance(getattr(resp, "result", None), dict) else {}
+            except Exception as e:
+                # sin lote: get_token_data hará la llamada individual como antes
+                logger.error(f"GoPlus error batch_check({len(chunk)} direcciones): {e}")
+                continue
+            for k, v in nodes.items():
+                if v:
+                    _TOKEN_DATA_CACHE.set(k.lower(), v)
+                    result[k.lower()] = v
+        return result
+
+    def _fetch_token_data(self, token, token_addr_lower: str) -> dict:
         try:
             resp = self.client.token_security(
                 chain_id="56",  # BSC mainnet
@@ -37,7 +93,6 @@ class GoplusService:
                 logger.error(f"Respuesta inesperada de GoPlus para {token.symbol}: {resp}")
                 return {}
 
-            token_addr_lower = token.address.lower()
             if token_addr_lower in resp.result:
                 return resp.result[token_addr_lower]
 
@@ -7,6 +7,8 @@ from repositories.monitor_repository import MonitorRepository
 
 logger = logger_manager.setup_logger(__name__)
 
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+
 def _esc(s: str) -> str:
     return (s or "").replace("\\","\\\\").replace("_","\\_").replace("*","\\*").replace("`","\\`").replace("[","\\[").replace("]","\\]")
 
@@ -81,7 +83,7 @@ class TelegramBot:
             await query.edit_message_text(f"🛑 Cancelada: `{pair}`", parse_mode="Markdown")
 
     async def _push_pending_actions(self, context: ContextTypes.DEFAULT_TYPE):
-        chat_id = os.getenv("TELEGRAM_CHAT_ID")
+        chat_id = TELEGRAM_CHAT_ID
         if not chat_id:
             logger.warning("TELEGRAM_CHAT_ID no definido; no puedo enviar push.")
             return
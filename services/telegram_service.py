@@ -1,5 +1,6 @@
 from __future__ import annotations
-import os, requests
+import os, queue, threading, time, requests
+from requests.adapters import HTTPAdapter
 from models.token import Token
 from utils.log_config import logger_manager, log_function
 from repositories.action_repository import ActionRepository
@@ -9,10 +10,32 @@ logger = logger_manager.setup_logger(__name__)
 TELEGRAM_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 API_BASE = f"https://api.telegram.org/bot{TELEGRAM_TOKEN}" if TELEGRAM_TOKEN else None
+# Envíos pendientes en cola; si se llena (API caída) se descartan los nuevos en vez de bloquear
+TELEGRAM_QUEUE_SIZE = int(os.getenv("TELEGRAM_QUEUE_SIZE", "200"))
+# espera máxima al vaciar la cola en el apagado (el hilo emisor es daemon)
+TELEGRAM_FLUSH_TIMEOUT = float(os.getenv("TELEGRAM_FLUSH_TIMEOUT", "5"))
+
+# escapado mínimo para Markdown, en una sola pasada
+_ESC_TABLE = str.maketrans({c: "\\" + c for c in "\\_*`[]"})
 
 def _esc(s: str) -> str:
-    # escapado mínimo para Markdown
-    return (s or "").replace("\\", "\\\\").replace("_", "\\_").replace("*", "\\*").replace("`", "\\`").replace("[","\\[").replace("]","\\]")
+    return (s or "").translate(_ESC_TABLE)
+
+def _token_info(token: Token) -> tuple[str, str | None, str]:
+    """(pair, token_address, bloque común Token/URL/Pair/Precio) de los avisos de token."""
+    pair = token.pair_address
+    token_addr = getattr(token, "address", None) or getattr(token, "token_address", None)
+    symbol = (getattr(token, "symbol", "") or "N/D").strip()
+    name = (getattr(token, "name", "") or "").strip()
+    price_txt = f"{float(getattr(token, 'price_native', 0.0) or 0.0):.8f}"
+    token_url = f"https://bscscan.com/token/{token_addr}" if token_addr else "N/D"
+    body = (
+        f"*Token:* {_esc(name)} ({_esc(symbol)})\n"
+        f"*Token URL:* {token_url}\n"
+        f"*Pair:* `{pair}`\n"
+        f"*Precio actual:* {price_txt} BNB"
+    )
+    return pair, token_addr, body
 
 class TelegramService:
     def __init__(self, token: str | None = None, chat_id: str | None = None,
@@ -20,41 +43,69 @@ class TelegramService:
         self.token = token or TELEGRAM_TOKEN
         self.chat_id = int(chat_id or TELEGRAM_CHAT_ID) if (chat_id or TELEGRAM_CHAT_ID) else None
         self.actions = actions or ActionRepository()
+        # Sesión persistente: reutiliza la conexión TLS con api.telegram.org entre envíos
+        self._http = requests.Session()
+        self._http.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+        # Los envíos salen desde un hilo propio: quien notifica (discovery/autobuy) no espera a la API
+        self._outbox: queue.Queue[dict] = queue.Queue(maxsize=TELEGRAM_QUEUE_SIZE)
+        self._sender: threading.Thread | None = None
+        self._sender_lock = threading.Lock()
         if not self.token or not self.chat_id:
             logger.warning("TelegramService sin TOKEN o CHAT_ID; se desactivan envíos.")
 
     def _send(self, text: str, reply_markup: dict | None = None) -> None:
+        """Encola el mensaje y vuelve enseguida; el POST lo hace el hilo telegram-sender."""
         if not API_BASE or not self.chat_id:
             return
         payload = {"chat_id": self.chat_id, "text": text, "parse_mode": "Markdown"}
         if reply_markup:
             payload["reply_markup"] = reply_markup
+        self._ensure_sender()
         try:
-            requests.post(f"{API_BASE}/sendMessage", json=payload, timeout=10).raise_for_status()
-        except Exception as e:
-            logger.error(f"❌ Error enviando Telegram: {e}")
+            self._outbox.put_nowait(payload)
+        except queue.Full:
+            logger.warning("⚠️ Cola de Telegram llena; mensaje descartado.")
 
-    @log_function
-    def solicitar_autorizacion(self, token: Token, tipo: str = "compra", contexto: str | None = None) -> None:
-        """
-        Enviar solicitud de autorización SOLO cuando no pasan filtros
-        o cuando el módulo de compra devuelve PENDING_USER (pnl/fees).
-        """
-        pair = token.pair_address
-        token_addr = getattr(token, "address", None) or getattr(token, "token_address", None)
-        symbol = (getattr(token, "symbol", "") or "N/D").strip()
-        name = (getattr(token, "name", "") or "").strip()
-        price_txt = f"{float(getattr(token, 'price_native', 0.0) or 0.0):.8f}"
-        motivo_txt = (contexto or "").strip() or "Sin detalle."
-        tipo_norm = "compra" if str(tipo).lower() in ("buy","compra") else "venta"
-        token_url = f"https://bscscan.com/token/{token_addr}" if token_addr else "N/D"
+    def _ensure_sender(self) -> None:
+        if self._sender is not None:
+            return
+        with self._sender_lock:
+            if self._sender is None:
+                self._sender = threading.Thread(target=self._bucle_envio, name="telegram-sender", daemon=True)
+                self._sender.start()
+
+    def _bucle_envio(self) -> None:
+        while True:
+            payload = self._outbox.get()
+            try:
+                self._http.post(f"{API_BASE}/sendMessage", json=payload, timeout=10).raise_for_status()
+            except Exception as e:
+                logger.error(f"❌ Error enviando Telegram: {e}")
+            finally:
+                self._outbox.task_done()
 
+    def flush(self, timeout: float = TELEGRAM_FLUSH_TIMEOUT) -> bool:
+        """Espera a que el hilo emisor vacíe la cola, como mucho `timeout` s. True si no queda nada."""
+        if self._sender is None:
+            return True
+        deadline = time.monotonic() + timeout
+        with self._outbox.all_tasks_done:
+            while self._outbox.unfinished_tasks:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logger.warning(f"⚠️ Telegram: {self._outbox.unfinished_tasks} mensajes sin enviar al apagar.")
+                    return False
+                self._outbox.all_tasks_done.wait(remaining)
+        return True
+
+    @staticmethod
+    def _mensaje_autorizacion(token: Token, tipo_norm: str, contexto: str | None) -> tuple[str, dict, tuple[str, str, str | None, str]]:
+        """(texto, teclado, fila para registrar_accion) de la solicitud de un token."""
+        pair, token_addr, body = _token_info(token)
+        motivo_txt = (contexto or "").strip() or "Sin detalle."
         msg = (
             f"📢 *Confirmación requerida: {tipo_norm.upper()}*\n\n"
-            f"*Token:* {_esc(name)} ({_esc(symbol)})\n"
-            f"*Token URL:* {token_url}\n"
-            f"*Pair:* `{pair}`\n"
-            f"*Precio actual:* {price_txt} BNB\n\n"
+            f"{body}\n\n"
             f"*Motivo:* {_esc(motivo_txt)}"
         )
         kb = {
@@ -63,26 +114,42 @@ class TelegramService:
                 {"text": "🛑 Rechazar",  "callback_data": f"cancelar:{pair}"}
             ]]
         }
+        return msg, kb, (pair, tipo_norm, token_addr, motivo_txt)
+
+    @log_function
+    def solicitar_autorizacion(self, token: Token, tipo: str = "compra", contexto: str | None = None) -> None:
+        """
+        Enviar solicitud de autorización SOLO cuando no pasan filtros
+        o cuando el módulo de compra devuelve PENDING_USER (pnl/fees).
+        """
+        tipo_norm = "compra" if str(tipo).lower() in ("buy","compra") else "venta"
+        msg, kb, (pair, _, token_addr, motivo_txt) = self._mensaje_autorizacion(token, tipo_norm, contexto)
         self._send(msg, reply_markup=kb)
         # Persistir acto pendiente
         self.actions.registrar_accion(pair, tipo_norm, token_address=token_addr, motivo=motivo_txt)
 
+    @log_function
+    def solicitar_autorizacion_lote(self, solicitudes: list[tuple[Token, str | None]], tipo: str = "compra") -> None:
+        """
+        Igual que solicitar_autorizacion para varios tokens (token, contexto) del mismo ciclo.
+        Un mensaje por token (el bot edita el mensaje del botón pulsado), pero las acciones
+        pendientes se registran en una sola transacción.
+        """
+        if not solicitudes:
+            return
+        tipo_norm = "compra" if str(tipo).lower() in ("buy","compra") else "venta"
+        acciones: list[tuple[str, str, str | None, str]] = []
+        for token, contexto in solicitudes:
+            msg, kb, accion = self._mensaje_autorizacion(token, tipo_norm, contexto)
+            self._send(msg, reply_markup=kb)
+            acciones.append(accion)
+        self.actions.registrar_acciones(acciones)
+
     @log_function
     def notificar_autorizado_info(self, token: Token) -> None:
         """Mensaje informativo para tokens que pasaron filtros (SIN botones)."""
-        pair = token.pair_address
-        token_addr = getattr(token, "address", None) or getattr(token, "token_address", None)
-        symbol = (getattr(token, "symbol", "") or "N/D").strip()
-        name = (getattr(token, "name", "") or "").strip()
-        price_txt = f"{float(getattr(token, 'price_native', 0.0) or 0.0):.8f}"
-        token_url = f"https://bscscan.com/token/{token_addr}" if token_addr else "N/D"
-        msg = (
-            f"✅ *Autorizado por filtros*\n\n"
-            f"*Token:* {_esc(name)} ({_esc(symbol)})\n"
-            f"*Token URL:* {token_url}\n"
-            f"*Pair:* `{pair}`\n"
-            f"*Precio actual:* {price_txt} BNB"
-        )
+        _, _, body = _token_info(token)
+        msg = f"✅ *Autorizado por filtros*\n\n{body}"
         self._send(msg)
 
     @log_function
@@ -92,3 +159,24 @@ class TelegramService:
     @log_function
     def notificar_error(self, mensaje: str): 
         self._send(f"🚨 *ERROR*: {mensaje}")
+
+
+# Instancia compartida entre controladores (misma configuración de entorno)
+_shared_service: TelegramService | None = None
+_shared_lock = threading.Lock()
+
+
+def get_telegram_service() -> TelegramService:
+    """Devuelve el TelegramService del proceso, creándolo en la primera llamada."""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_lock:
+            if _shared_service is None:
+                _shared_service = TelegramService()
+    return _shared_service
+
+
+def flush_telegram_service(timeout: float = TELEGRAM_FLUSH_TIMEOUT) -> bool:
+    """Vacía la cola del servicio compartido si llegó a crearse (no lo crea sólo para esto)."""
+    service = _shared_service
+    return service.flush(timeout) if service is not None else True
@@ -1,13 +1,17 @@
 from __future__ import annotations
 import os
+import threading
 from typing import Any, List, Optional, Callable
 from time import time, sleep
 
+import requests
+from requests.adapters import HTTPAdapter
 from web3 import Web3
 from web3.middleware import ExtraDataToPOAMiddleware
 from web3.types import TxReceipt, HexBytes
 from eth_account import Account
-from web3.exceptions import ContractLogicError
+from eth_abi import encode as abi_encode, decode as abi_decode
+from web3.exceptions import ContractLogicError, TimeExhausted, TransactionNotFound
 
 # Compat logger (según tu repo puede ser utils.logger o utils.log_config)
 try:
@@ -16,6 +20,7 @@ except Exception:
     from utils.log_config import logger_manager, log_function
 
 from utils.load_abi import load_erc20_abi, load_pancake_router_abi
+from utils.ttl_cache import TTLCache
 
 logger = logger_manager.setup_logger(__name__)
 
@@ -39,15 +44,24 @@ DRY_RUN          = os.getenv("DRY_RUN", "true").lower() == "true"
 REQUEST_TIMEOUT_SECS   = float(os.getenv("RPC_TIMEOUT_SECS", "30"))
 RETRY_RPC_TIMES        = int(os.getenv("RPC_RETRIES", "3"))
 RETRY_BACKOFF_SECS     = float(os.getenv("RPC_RETRY_BACKOFF_SECS", "0.4"))
+# conexiones keep-alive por host RPC: >= hilos que llaman a la vez (autobuy + autosell-io + receipts)
+RPC_POOL_MAXSIZE       = int(os.getenv("RPC_POOL_MAXSIZE", "32"))
 
 # GAS_MODE: auto | legacy | 1559
 GAS_MODE               = os.getenv("GAS_MODE", "auto").lower()
 GAS_PRICE_WEI_OVERRIDE = int(os.getenv("GAS_PRICE_WEI", "0"))  # fuerza gasPrice si > 0
 PRIORITY_FEE_GWEI      = float(os.getenv("PRIORITY_FEE_GWEI", "1.5"))
+PRIORITY_FEE_WEI       = int(Web3.to_wei(PRIORITY_FEE_GWEI, "gwei"))
 MAX_FEE_MULTIPLIER     = float(os.getenv("MAX_FEE_MULTIPLIER", "2.0"))  # maxFee ~= baseFee*mult + priority
 GAS_LIMIT_MULTIPLIER   = float(os.getenv("GAS_LIMIT_MULTIPLIER", "1.20"))
 DEFAULT_SWAP_GAS_LIMIT = int(os.getenv("DEFAULT_SWAP_GAS_LIMIT", "350000"))
 SKIP_GAS_EST_IN_DRY    = os.getenv("SKIP_GAS_EST_IN_DRY", "true").lower() == "true"
+TOKEN_CACHE_MAX        = int(os.getenv("TOKEN_CACHE_MAX", "4096"))  # contratos ERC20 cacheados
+MULTICALL3_ADDRESS     = os.getenv("MULTICALL3_ADDRESS", "0xcA11bde05977b3631167028862bE2a173976CA11")
+QUOTE_CACHE_TTL        = float(os.getenv("QUOTE_CACHE_TTL", "3"))  # s; ~1 bloque BSC, 0 desactiva
+GAS_PRICE_CACHE_TTL    = float(os.getenv("GAS_PRICE_CACHE_TTL", "1"))  # s; gasPrice / fees 1559, 0 desactiva
+RECEIPT_POLL_SECS      = float(os.getenv("RECEIPT_POLL_SECS", "0.5"))  # < tiempo de bloque BSC
+NONCE_CACHE_TTL        = float(os.getenv("NONCE_CACHE_TTL", "15"))  # s; pasado este tiempo se relee del nodo, 0 desactiva
 
 # ABI mínima de la factory (para comprobar pares)
 PANCAKE_FACTORY_ABI = [
@@ -63,6 +77,72 @@ PANCAKE_FACTORY_ABI = [
     }
 ]
 
+# Calldata de getAmountsOut(uint256,address[]) codificada a mano: la disposición es fija
+# (selector | amountIn | offset 0x40 | len(path) | direcciones con padding a 32 bytes)
+_SEL_GET_AMOUNTS_OUT = bytes(Web3.keccak(text="getAmountsOut(uint256,address[])")[:4])
+_SEL_DECIMALS = bytes(Web3.keccak(text="decimals()")[:4])
+_SEL_ALLOWANCE = bytes(Web3.keccak(text="allowance(address,address)")[:4])
+_SEL_AGGREGATE3 = bytes(Web3.keccak(text="aggregate3((address,bool,bytes)[])")[:4])
+_SEL_SWAP_EXACT_ETH_FOR_TOKENS = bytes(Web3.keccak(text="swapExactETHForTokens(uint256,address[],address,uint256)")[:4])
+_SEL_SWAP_EXACT_TOKENS_FOR_ETH = bytes(Web3.keccak(text="swapExactTokensForETH(uint256,uint256,address[],address,uint256)")[:4])
+_SEL_APPROVE = bytes(Web3.keccak(text="approve(address,uint256)")[:4])
+_ARRAY_OFFSET = (0x40).to_bytes(32, "big")
+_SWAP_PATH_OFFSET = (0x80).to_bytes(32, "big")
+_SELL_PATH_OFFSET = (0xa0).to_bytes(32, "big")
+_ADDR_PAD = bytes(12)
+
+# 10**d precalculado para cualquier decimals() ERC20 (uint8)
+POW10 = tuple(10 ** d for d in range(256))
+
+
+def _encode_get_amounts_out(amount_in_wei: int, path_cs: List[str]) -> bytes:
+    return b"".join((
+        _SEL_GET_AMOUNTS_OUT,
+        int(amount_in_wei).to_bytes(32, "big"),
+        _ARRAY_OFFSET,
+        len(path_cs).to_bytes(32, "big"),
+        *(_ADDR_PAD + bytes.fromhex(a[2:]) for a in path_cs),
+    ))
+
+
+def _encode_swap_exact_eth_for_tokens(amount_out_min: int, path_cs: List[str], to_cs: str, deadline: int) -> bytes:
+    # cabecera: amountOutMin | offset path (0x80) | to | deadline; cola: len(path) | direcciones
+    return b"".join((
+        _SEL_SWAP_EXACT_ETH_FOR_TOKENS,
+        int(amount_out_min).to_bytes(32, "big"),
+        _SWAP_PATH_OFFSET,
+        _ADDR_PAD + bytes.fromhex(to_cs[2:]),
+        int(deadline).to_bytes(32, "big"),
+        len(path_cs).to_bytes(32, "big"),
+        *(_ADDR_PAD + bytes.fromhex(a[2:]) for a in path_cs),
+    ))
+
+
+def _encode_swap_exact_tokens_for_eth(amount_in: int, amount_out_min: int, path_cs: List[str], to_cs: str, deadline: int) -> bytes:
+    # cabecera: amountIn | amountOutMin | offset path (0xa0) | to | deadline; cola: len(path) | direcciones
+    return b"".join((
+        _SEL_SWAP_EXACT_TOKENS_FOR_ETH,
+        int(amount_in).to_bytes(32, "big"),
+        int(amount_out_min).to_bytes(32, "big"),
+        _SELL_PATH_OFFSET,
+        _ADDR_PAD + bytes.fromhex(to_cs[2:]),
+        int(deadline).to_bytes(32, "big"),
+        len(path_cs).to_bytes(32, "big"),
+        *(_ADDR_PAD + bytes.fromhex(a[2:]) for a in path_cs),
+    ))
+
+
+def _encode_approve(spender_cs: str, amount: int) -> bytes:
+    return _SEL_APPROVE + _ADDR_PAD + bytes.fromhex(spender_cs[2:]) + int(amount).to_bytes(32, "big")
+
+
+def _decode_uint_array(ret: bytes) -> list[int]:
+    # uint256[] dinámico: offset | longitud | elementos
+    if len(ret) < 64:
+        return []
+    n = int.from_bytes(ret[32:64], "big")
+    return [int.from_bytes(ret[64 + 32 * i:96 + 32 * i], "big") for i in range(n)]
+
 
 class Web3Service:
     def __init__(self, rpc_url: Optional[str] = None) -> None:
@@ -72,13 +152,38 @@ class Web3Service:
             self._rpc_urls = ["https://bsc-dataseed.binance.org"]
 
         self._current_rpc_idx = -1
+        # Sesión HTTP propia para el HTTPProvider: el adaptador por defecto de requests guarda
+        # 10 conexiones por host y, con más hilos concurrentes, las sobrantes se cierran tras cada RPC
+        self._http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=RPC_POOL_MAXSIZE)
+        self._http.mount("https://", adapter)
+        self._http.mount("http://", adapter)
         self._connect_first_ok()
 
         self._account = Account.from_key(PRIVATE_KEY) if PRIVATE_KEY else None
         self._router_addr = self._w3.to_checksum_address(ROUTER_ADDRESS)
         self._wbnb_addr = self._w3.to_checksum_address(WBNB_ADDRESS)
+        self._multicall_addr = self._w3.to_checksum_address(MULTICALL3_ADDRESS)
         self._router_abi = load_pancake_router_abi()
         self._erc20_abi = load_erc20_abi()
+        # decimals() es inmutable por token: se cachea por dirección checksum,
+        # igual que el objeto Contract (evita re-procesar la ABI en cada llamada)
+        self._decimals_cache: dict[str, int] = {}
+        self._erc20_cache: dict[str, Any] = {}
+        self._cache_lock = threading.Lock()  # el servicio se comparte entre hilos de autobuy
+        # getAmountsOut por (path, amountIn), compartida por get_amounts_out y quote_buy:
+        # propose_buy/confirm_pending_buy y preview_swap/build_swap_tx repiten la cotización en segundos
+        self._quote_cache: TTLCache[tuple[int, ...]] = TTLCache(maxsize=2048, ttl=QUOTE_CACHE_TTL)
+        # gasPrice (legacy) o (baseFee, priority) (1559): propose_buy y la tx final piden lo mismo en segundos
+        self._gas_cache: TTLCache[Any] = TTLCache(maxsize=2, ttl=GAS_PRICE_CACHE_TTL)
+        # nonce llevado en local: se consulta al nodo, avanza con cada envío y caduca a los NONCE_CACHE_TTL s
+        self._next_nonce: Optional[int] = None
+        self._nonce_read_at = 0.0
+        self._nonce_lock = threading.Lock()
+        # receipts pendientes: un único hilo los sondea todos juntos (un batch JSON-RPC por tick)
+        self._receipt_waiters: dict[str, dict[str, Any]] = {}
+        self._receipt_lock = threading.Lock()
+        self._receipt_thread: Optional[threading.Thread] = None
 
         # Contratos
         self._router = self._w3.eth.contract(address=self._router_addr, abi=self._router_abi)
@@ -94,15 +199,16 @@ class Web3Service:
 
         # Detección de modo gas
         self._gas_mode = self._detect_gas_mode()
+        # chain_id no cambia al rotar de RPC (todos son BSC): se pide una sola vez
         try:
-            chain = self._w3.eth.chain_id
+            self._chain_id: Optional[int] = int(self._w3.eth.chain_id)
         except Exception:
-            chain = "?"
-        logger.debug(f"Conectado a {self._active_rpc}; chain_id={chain}; gas_mode={self._gas_mode}")
+            self._chain_id = None
+        logger.debug(f"Conectado a {self._active_rpc}; chain_id={self._chain_id or '?'}; gas_mode={self._gas_mode}")
 
     # ---------- conexión / failover ----------
     def _connect(self, url: str) -> Web3:
-        w3 = Web3(Web3.HTTPProvider(url, request_kwargs={"timeout": REQUEST_TIMEOUT_SECS}))
+        w3 = Web3(Web3.HTTPProvider(url, request_kwargs={"timeout": REQUEST_TIMEOUT_SECS}, session=self._http))
         # BSC estilo PoA (aunque no lo necesite en mainnet, no molesta)
         w3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
         if not w3.is_connected():
@@ -130,6 +236,11 @@ class Web3Service:
         logger.info(f"Cambiando a RPC: {url}")
         self._w3 = self._connect(url)
         self._active_rpc = url
+        # los contratos quedan ligados al proveedor anterior: se reconstruyen
+        self._erc20_cache.clear()
+        self._router = self._w3.eth.contract(address=self._router_addr, abi=self._router_abi)
+        if self._factory:
+            self._factory = self._w3.eth.contract(address=self._factory.address, abi=PANCAKE_FACTORY_ABI)
 
     def _rpc_call(self, label: str, fn: Callable[[], Any], retries: int = RETRY_RPC_TIMES) -> Any:
         """
@@ -159,18 +270,45 @@ class Web3Service:
         return self._router
 
     def load_erc20(self, address: str):
-        return self._w3.eth.contract(address=self.checksum(address), abi=self._erc20_abi)
+        # la mayoría de llamadores ya pasan la dirección en checksum: acierto sin recalcular keccak
+        contract = self._erc20_cache.get(address)
+        if contract is not None:
+            return contract
+        addr = self.checksum(address)
+        contract = self._erc20_cache.get(addr)
+        if contract is None:
+            contract = self._w3.eth.contract(address=addr, abi=self._erc20_abi)
+            with self._cache_lock:
+                if len(self._erc20_cache) >= TOKEN_CACHE_MAX:
+                    # descarta el más antiguo (orden de inserción)
+                    self._erc20_cache.pop(next(iter(self._erc20_cache)), None)
+                self._erc20_cache[addr] = contract
+        return contract
 
-    @log_function
     def get_token_decimals(self, erc20_contract) -> int:
+        return self.token_decimals(erc20_contract.address)
+
+    def token_decimals(self, token_address: str) -> int:
+        # acierto directo si ya llega en checksum: evita el keccak de to_checksum_address
+        cached = self._decimals_cache.get(token_address)
+        if cached is not None:
+            return cached
+        addr = self.checksum(token_address)
+        cached = self._decimals_cache.get(addr)
+        if cached is not None:
+            return cached
+        erc20 = self.load_erc20(addr)
         try:
-            return int(self._rpc_call("decimals", lambda: erc20_contract.functions.decimals().call()))
+            decimals = int(self._rpc_call("decimals", lambda: erc20.functions.decimals().call()))
         except ContractLogicError:
             # Hay shitcoins que no implementan bien ERC20 -> por defecto 18
-            return 18
+            decimals = 18
         except Exception as e:
+            # error de red: no se cachea para reintentar en la próxima llamada
             logger.error(f"✗ get_token_decimals: {e}")
             return 18
+        self._decimals_cache[addr] = decimals
+        return decimals
 
     # ---------- detección gas ----------
     def _detect_gas_mode(self) -> str:
@@ -191,10 +329,72 @@ class Web3Service:
     def _legacy_gas_price(self) -> int | None:
         if GAS_PRICE_WEI_OVERRIDE > 0:
             return GAS_PRICE_WEI_OVERRIDE
+        cached = self._gas_cache.get("legacy") if GAS_PRICE_CACHE_TTL > 0 else None
+        if cached is not None:
+            return cached
         try:
-            return int(self._rpc_call("gas_price", lambda: self._w3.eth.gas_price))
+            gas_price = int(self._rpc_call("gas_price", lambda: self._w3.eth.gas_price))
         except Exception:
             return None
+        if GAS_PRICE_CACHE_TTL > 0:
+            self._gas_cache.set("legacy", gas_price)
+        return gas_price
+
+    def _fees_1559(self) -> tuple[int, int]:
+        """(baseFee, priorityFee), cacheados GAS_PRICE_CACHE_TTL segundos."""
+        cached = self._gas_cache.get("1559") if GAS_PRICE_CACHE_TTL > 0 else None
+        if cached is not None:
+            return cached
+        fees = self._fetch_fees_1559()
+        if GAS_PRICE_CACHE_TTL > 0:
+            self._gas_cache.set("1559", fees)
+        return fees
+
+    def warm_gas_fees(self) -> None:
+        """
+        Rellena la caché de gas (gasPrice o fees 1559) sin construir tx: pensado para lanzarse
+        en paralelo con la cotización, de modo que el build posterior no espere otro RPC.
+        """
+        if GAS_PRICE_CACHE_TTL <= 0:
+            return
+        try:
+            if self._gas_mode == "1559":
+                self._fees_1559()
+            else:
+                self._legacy_gas_price()
+        except Exception as e:
+            logger.debug(f"warm_gas_fees: {e}")
+
+    def _fetch_fees_1559(self) -> tuple[int, int]:
+        """
+        Bloque 'latest' y eth_maxPriorityFeePerGas van en un único batch JSON-RPC;
+        si el nodo no lo admite se piden por separado como antes.
+        """
+        try:
+            responses = self._w3.provider.make_batch_request([
+                ("eth_getBlockByNumber", ["latest", False]),
+                ("eth_maxPriorityFeePerGas", []),
+            ])
+            block, prio = responses
+            base_fee = int(block["result"]["baseFeePerGas"], 16)
+            priority = int(prio["result"], 16) if prio.get("result") else PRIORITY_FEE_WEI
+            return base_fee, priority
+        except Exception as e:
+            logger.debug(f"fees 1559: batch no disponible ({e}); consultas sueltas")
+
+        # baseFee
+        try:
+            latest = self._rpc_call("get_block_latest", lambda: self._w3.eth.get_block("latest"))
+            base_fee = int(latest.get("baseFeePerGas") or self._rpc_call("gas_price", lambda: self._w3.eth.gas_price))
+        except Exception:
+            base_fee = int(self._rpc_call("gas_price", lambda: self._w3.eth.gas_price))
+        # priority fee
+        try:
+            # web3.py 7.x
+            priority = int(self._rpc_call("max_priority_fee", lambda: self._w3.eth.max_priority_fee))
+        except Exception:
+            priority = PRIORITY_FEE_WEI
+        return base_fee, priority
 
     def _apply_gas_fields(self, tx: dict) -> dict:
         """
@@ -209,18 +409,7 @@ class Web3Service:
 
         if self._gas_mode == "1559":
             tx["type"] = 2
-            # baseFee
-            try:
-                latest = self._rpc_call("get_block_latest", lambda: self._w3.eth.get_block("latest"))
-                base_fee = int(latest.get("baseFeePerGas") or self._rpc_call("gas_price", lambda: self._w3.eth.gas_price))
-            except Exception:
-                base_fee = int(self._rpc_call("gas_price", lambda: self._w3.eth.gas_price))
-            # priority fee
-            try:
-                # web3.py 7.x
-                priority = int(self._rpc_call("max_priority_fee", lambda: self._w3.eth.max_priority_fee))
-            except Exception:
-                priority = int(Web3.to_wei(PRIORITY_FEE_GWEI, "gwei"))
+            base_fee, priority = self._fees_1559()
             max_fee = int(base_fee * MAX_FEE_MULTIPLIER + priority)
             tx["maxPriorityFeePerGas"] = priority
             tx["maxFeePerGas"] = max_fee
@@ -232,6 +421,36 @@ class Web3Service:
 
         return tx
 
+    # ---------- chain id / nonce ----------
+    def _get_chain_id(self) -> int:
+        if self._chain_id is None:
+            self._chain_id = int(self._rpc_call("chain_id", lambda: self._w3.eth.chain_id))
+        return self._chain_id
+
+    def _get_nonce(self) -> int:
+        """
+        Siguiente nonce de la cuenta. Se consulta al nodo ('pending') si no hay valor local o
+        si la última lectura tiene más de NONCE_CACHE_TTL s: una tx descartada o enviada desde
+        fuera del proceso no deja el contador local desfasado hasta reiniciar.
+        Construir una tx no lo consume (propose_buy construye txs que quizá nunca se envían).
+        """
+        with self._nonce_lock:
+            now = time()
+            if self._next_nonce is None or now - self._nonce_read_at > NONCE_CACHE_TTL:
+                self._next_nonce = int(self._rpc_call(
+                    "get_transaction_count",
+                    lambda: self._w3.eth.get_transaction_count(self._account.address, "pending"),
+                ))
+                self._nonce_read_at = now
+            return self._next_nonce
+
+    def _nonce_sent(self, nonce: int | None) -> None:
+        with self._nonce_lock:
+            if nonce is None:
+                self._next_nonce = None  # estado desconocido: se vuelve a consultar al nodo
+            elif self._next_nonce is None or nonce >= self._next_nonce:
+                self._next_nonce = int(nonce) + 1
+
     # ---------- pares ----------
     def _pair_exists(self, token_a: str, token_b: str) -> bool:
         if not self._factory:
@@ -254,21 +473,29 @@ class Web3Service:
         return True
 
     # ---------- quotes ----------
-    @log_function
     def get_amounts_out(self, amount_in_wei: int, path: List[str]) -> list[int]:
         router = self.load_router()
         path_cs = [self.checksum(p) for p in path]
         if amount_in_wei is None or int(amount_in_wei) <= 0:
             return [0] * len(path_cs)
+        amounts_key = (tuple(path_cs), int(amount_in_wei))
+        if QUOTE_CACHE_TTL > 0:
+            cached = self._quote_cache.get(amounts_key)
+            if cached is not None:
+                return list(cached)
         if not self._path_pairs_exist(path_cs):
             logger.debug(f"get_amounts_out: par inexistente para path={path_cs}")
             return [0] * len(path_cs)
+        call = {"to": router.address, "data": _encode_get_amounts_out(amount_in_wei, path_cs)}
         try:
-            amounts = self._rpc_call(
-                "router.getAmountsOut",
-                lambda: router.functions.getAmountsOut(int(amount_in_wei), path_cs).call()
-            )
-            return [int(x) for x in amounts]
+            ret = self._rpc_call("router.getAmountsOut", lambda: self._w3.eth.call(call))
+            amounts = _decode_uint_array(ret)
+            if not amounts:
+                return [0] * len(path_cs)
+            # sólo cotizaciones válidas: un par sin liquidez todavía puede recibirla en el siguiente bloque
+            if QUOTE_CACHE_TTL > 0 and int(amounts[-1]) > 0:
+                self._quote_cache.set(amounts_key, tuple(amounts))
+            return amounts
         except ContractLogicError as e:
             logger.error(f"✗ get_amounts_out (revert): {e}")
             return [0] * len(path_cs)
@@ -284,6 +511,106 @@ class Web3Service:
             return 0
         return int(int(amts[-1]) * (1 - (slippage / 100.0)))
 
+    def multicall_reads(self, calls: List[tuple[str, bytes]]) -> list[tuple[bool, bytes]]:
+        """
+        Ejecuta varias lecturas (to, calldata) en un único eth_call a Multicall3.aggregate3
+        con allowFailure=True: un revert individual no tumba al resto. Devuelve [(ok, returnData)].
+        """
+        data = _SEL_AGGREGATE3 + abi_encode(["(address,bool,bytes)[]"], [[(to, True, cd) for to, cd in calls]])
+        ret = self._w3.eth.call({"to": self._multicall_addr, "data": data})
+        return [(bool(ok), bytes(out)) for ok, out in abi_decode(["(bool,bytes)[]"], ret)[0]]
+
+    @log_function
+    def quote_buy(self, amount_in_wei: int, token_address: str, slippage_percent: float | None = None) -> tuple[int, int]:
+        """
+        Devuelve (amount_out_min, decimals) para WBNB -> token.
+        getAmountsOut y decimals() viajan en un único eth_call vía Multicall3 (un solo round-trip,
+        y un par sin liquidez no provoca reintentos); si Multicall3 no responde, cae a las llamadas sueltas.
+        """
+        slippage = DEFAULT_SLIPPAGE if slippage_percent is None else slippage_percent
+        token_cs = self.checksum(token_address)
+        path = [self._wbnb_addr, token_cs]
+        if amount_in_wei is None or int(amount_in_wei) <= 0:
+            return 0, self.token_decimals(token_cs)
+
+        decimals = self._decimals_cache.get(token_cs)
+        # misma clave que get_amounts_out: las dos rutas comparten cotización
+        quote_key = (tuple(path), int(amount_in_wei))
+        if QUOTE_CACHE_TTL > 0 and decimals is not None:
+            cached = self._quote_cache.get(quote_key)
+            if cached is not None:
+                return int(int(cached[-1]) * (1 - (slippage / 100.0))), decimals
+
+        calls = [(self._router_addr, _encode_get_amounts_out(amount_in_wei, path))]
+        if decimals is None:
+            calls.append((token_cs, _SEL_DECIMALS))
+        try:
+            results = self.multicall_reads(calls)
+        except Exception as e:
+            logger.debug(f"quote_buy: multicall no disponible ({e}); usando llamadas sueltas")
+            return self.get_amount_out_min(amount_in_wei, path, slippage), self.token_decimals(token_cs)
+
+        ok_amounts, ret_amounts = results[0]
+        if decimals is None:
+            ok_dec, ret_dec = results[1]
+            dec = int.from_bytes(ret_dec[:32], "big") if ok_dec and len(ret_dec) >= 32 else None
+            if dec is not None and dec <= 255:
+                # uint8 válido (lo mismo que exigiría el decoder ABI de web3)
+                decimals = dec
+                self._decimals_cache[token_cs] = decimals
+            elif not ok_dec:
+                decimals = 18  # decimals() revierte: mismo criterio que token_decimals
+                self._decimals_cache[token_cs] = decimals
+            else:
+                # sin código en la dirección, respuesta corta o fuera de uint8: no se cachea
+                decimals = 18
+        amounts = _decode_uint_array(ret_amounts) if ok_amounts else []
+        if not amounts or int(amounts[-1]) <= 0:
+            return 0, decimals
+        if QUOTE_CACHE_TTL > 0:
+            self._quote_cache.set(quote_key, tuple(amounts))
+        return int(int(amounts[-1]) * (1 - (slippage / 100.0))), decimals
+
+    @log_function
+    def quote_sell(
+        self,
+        token_address: str,
+        amount_in_raw: int,
+        owner: str,
+        spender: str,
+        slippage_percent: float | None = None,
+    ) -> tuple[int, int]:
+        """
+        Devuelve (amount_out_min_bnb_wei, allowance) para token -> WBNB.
+        getAmountsOut y allowance(owner, spender) viajan en un único eth_call vía Multicall3;
+        si Multicall3 no responde, cae a las llamadas sueltas.
+        """
+        slippage = DEFAULT_SLIPPAGE if slippage_percent is None else slippage_percent
+        token_cs = self.checksum(token_address)
+        owner_cs, spender_cs = self.checksum(owner), self.checksum(spender)
+        if amount_in_raw is None or int(amount_in_raw) <= 0:
+            return 0, self.allowance(token_cs, owner_cs, spender_cs)
+
+        calls = [
+            (self._router_addr, _encode_get_amounts_out(amount_in_raw, [token_cs, self._wbnb_addr])),
+            (token_cs, _SEL_ALLOWANCE + _ADDR_PAD + bytes.fromhex(owner_cs[2:]) + _ADDR_PAD + bytes.fromhex(spender_cs[2:])),
+        ]
+        try:
+            (ok_amounts, ret_amounts), (ok_allow, ret_allow) = self.multicall_reads(calls)
+        except Exception as e:
+            logger.debug(f"quote_sell: multicall no disponible ({e}); usando llamadas sueltas")
+            return (
+                self.get_amount_out_min_token_to_bnb(token_cs, amount_in_raw, slippage),
+                self.allowance(token_cs, owner_cs, spender_cs),
+            )
+
+        # allowance que revierte o sin código: 0 -> se construirá el approve
+        allowance = int.from_bytes(ret_allow[-32:], "big") if ok_allow and ret_allow else 0
+        amounts = _decode_uint_array(ret_amounts) if ok_amounts else []
+        if not amounts or int(amounts[-1]) <= 0:
+            return 0, allowance
+        return int(int(amounts[-1]) * (1 - (slippage / 100.0))), allowance
+
     # ---------- builders ----------
     @log_function
     def build_swap_exact_eth_for_tokens(
@@ -292,28 +619,31 @@ class Web3Service:
         amount_out_min: int,
         token_address: str,
         deadline_secs_from_now: int = 60,
+        check_pool: bool = True,
     ) -> dict[str, Any]:
+        """
+        check_pool=False cuando el llamador ya cotizó la ruta con getAmountsOut > 0
+        (el router revierte si falta el par), y así se ahorra el getPair.
+        """
         if not self._account:
             raise RuntimeError("No hay PRIVATE_KEY configurada para firmar.")
 
         path = [self._wbnb_addr, self.checksum(token_address)]
         # 1) check de pool para evitar reverts tontos
-        if not self._path_pairs_exist(path):
+        if check_pool and not self._path_pairs_exist(path):
             raise ValueError(f"No existe pool WBNB -> {self.checksum(token_address)} en Pancake.")
 
-        # 2) construye la tx base
-        func = self._router.functions.swapExactETHForTokens(
-            int(max(0, amount_out_min)),
-            path,
-            self._account.address,
-            int(time()) + deadline_secs_from_now
-        )
-        tx = func.build_transaction({
-            "from": self._account.address,
+        # 2) construye la tx base: calldata codificada a mano y chainId/nonce sin ida y vuelta al nodo
+        to_cs = self._account.address
+        deadline = int(time()) + deadline_secs_from_now
+        tx = {
+            "from": to_cs,
+            "to": self._router_addr,
             "value": int(amount_in_wei),
-            "nonce": self._rpc_call("get_transaction_count", lambda: self._w3.eth.get_transaction_count(self._account.address)),
-            "chainId": self._rpc_call("chain_id", lambda: self._w3.eth.chain_id),
-        })
+            "data": _encode_swap_exact_eth_for_tokens(int(max(0, amount_out_min)), path, to_cs, deadline),
+            "nonce": self._get_nonce(),
+            "chainId": self._get_chain_id(),
+        }
 
         # 3) aplica gas (legacy o 1559, pero sin mezclar)
         tx = self._apply_gas_fields(tx)
@@ -328,16 +658,7 @@ class Web3Service:
             estimated_gas = int(self._rpc_call("estimate_gas", lambda: self._w3.eth.estimate_gas(tx)))
         except Exception:
             # intento suave: relajar amountOutMin a 0 solo para gas-estimate
-            func0 = self._router.functions.swapExactETHForTokens(
-                0, path, self._account.address, int(time()) + deadline_secs_from_now
-            )
-            tx0 = func0.build_transaction({
-                "from": self._account.address,
-                "value": int(amount_in_wei),
-                "nonce": tx["nonce"],  # mismo nonce
-                "chainId": tx["chainId"],
-            })
-            tx0 = self._apply_gas_fields(tx0)
+            tx0 = dict(tx, data=_encode_swap_exact_eth_for_tokens(0, path, to_cs, deadline))
             estimated_gas = int(self._rpc_call("estimate_gas_relaxed", lambda: self._w3.eth.estimate_gas(tx0)))
 
         tx["gas"] = int(estimated_gas * GAS_LIMIT_MULTIPLIER)
@@ -347,12 +668,16 @@ class Web3Service:
         if not self._account:
             raise RuntimeError("No hay PRIVATE_KEY configurada para firmar.")
 
-        erc20 = self.load_erc20(token_address)
-        tx = erc20.functions.approve(self.checksum(spender), int(amount_wei)).build_transaction({
+        # calldata a mano: build_transaction del Contract pediría gas y fees al nodo,
+        # que aquí se vuelven a fijar justo después
+        tx = {
             "from": self._account.address,
-            "nonce": self._rpc_call("get_transaction_count", lambda: self._w3.eth.get_transaction_count(self._account.address)),
-            "chainId": self._rpc_call("chain_id", lambda: self._w3.eth.chain_id),
-        })
+            "to": self.checksum(token_address),
+            "value": 0,
+            "data": _encode_approve(self.checksum(spender), amount_wei),
+            "nonce": self._get_nonce(),
+            "chainId": self._get_chain_id(),
+        }
 
         tx = self._apply_gas_fields(tx)
 
@@ -370,22 +695,27 @@ class Web3Service:
         amount_in_tokens_raw: int,
         amount_out_min_bnb_wei: int,
         deadline_secs_from_now: int = 60,
+        nonce_offset: int = 0,
     ) -> dict:
+        """
+        nonce_offset=1 cuando se envía detrás de otra tx aún no enviada (el approve):
+        construir no consume nonce, así que ambas recibirían el mismo.
+        """
         if not self._account:
             raise RuntimeError("No hay PRIVATE_KEY configurada para firmar.")
 
         path = [self.checksum(token_address), self._wbnb_addr]
-        tx = self._router.functions.swapExactTokensForETH(
-            int(amount_in_tokens_raw),
-            int(amount_out_min_bnb_wei),
-            path,
-            self._account.address,
-            int(time()) + deadline_secs_from_now,
-        ).build_transaction({
-            "from": self._account.address,
-            "nonce": self._rpc_call("get_transaction_count", lambda: self._w3.eth.get_transaction_count(self._account.address)),
-            "chainId": self._rpc_call("chain_id", lambda: self._w3.eth.chain_id),
-        })
+        to_cs = self._account.address
+        tx = {
+            "from": to_cs,
+            "to": self._router_addr,
+            "value": 0,
+            "data": _encode_swap_exact_tokens_for_eth(
+                amount_in_tokens_raw, amount_out_min_bnb_wei, path, to_cs, int(time()) + deadline_secs_from_now
+            ),
+            "nonce": self._get_nonce() + nonce_offset,
+            "chainId": self._get_chain_id(),
+        }
 
         tx = self._apply_gas_fields(tx)
 
@@ -404,7 +734,12 @@ class Web3Service:
             logger.info(f"[DRY_RUN] No se envía tx. TX={tx}")
             return "0x" + "0" * 64
         signed = self._w3.eth.account.sign_transaction(tx, private_key=self._account.key)
-        tx_hash = self._rpc_call("send_raw_tx", lambda: self._w3.eth.send_raw_transaction(signed.rawTransaction))
+        try:
+            tx_hash = self._rpc_call("send_raw_tx", lambda: self._w3.eth.send_raw_transaction(signed.rawTransaction))
+        except Exception:
+            self._nonce_sent(None)
+            raise
+        self._nonce_sent(tx.get("nonce"))
         return tx_hash.hex()
 
     @log_function
@@ -433,7 +768,71 @@ class Web3Service:
         return int(int(amts[-1]) * (1 - (slippage / 100.0)))
 
     def wait_for_receipt(self, tx_hash: str | HexBytes, timeout: int = 180) -> TxReceipt:
-        return self._rpc_call("wait_for_receipt", lambda: self._w3.eth.wait_for_transaction_receipt(tx_hash, timeout=timeout))
+        """
+        Bloquea hasta que la tx esté minada. Los hilos que esperan no sondean por su cuenta:
+        registran el hash y el hilo de receipts consulta todos los pendientes en un solo batch.
+        """
+        h = HexBytes(tx_hash).to_0x_hex()
+        with self._receipt_lock:
+            waiter = self._receipt_waiters.get(h)
+            if waiter is None:
+                waiter = self._receipt_waiters[h] = {"event": threading.Event(), "receipt": None}
+            if self._receipt_thread is None:
+                self._receipt_thread = threading.Thread(target=self._receipt_poll_loop, name="receipts", daemon=True)
+                self._receipt_thread.start()
+
+        if not waiter["event"].wait(timeout):
+            with self._receipt_lock:
+                self._receipt_waiters.pop(h, None)
+            # la tx pudo descartarse o reemplazarse: el siguiente envío relee el nonce del nodo
+            self._nonce_sent(None)
+            raise TimeExhausted(f"Transaction {h} is not in the chain after {timeout} seconds")
+        receipt = waiter["receipt"]
+        if receipt is not None and receipt.get("status") == 0:
+            self._nonce_sent(None)
+        return receipt
+
+    def _receipt_poll_loop(self) -> None:
+        while True:
+            with self._receipt_lock:
+                hashes = list(self._receipt_waiters)
+                if not hashes:
+                    self._receipt_thread = None
+                    return
+            for h in self._mined_hashes(hashes):
+                try:
+                    receipt = self._rpc_call("get_receipt", lambda: self._w3.eth.get_transaction_receipt(h))
+                except Exception as e:
+                    logger.warning(f"receipt {h}: {e}")
+                    continue
+                with self._receipt_lock:
+                    waiter = self._receipt_waiters.pop(h, None)
+                if waiter:
+                    waiter["receipt"] = receipt
+                    waiter["event"].set()
+            sleep(RECEIPT_POLL_SECS)
+
+    def _mined_hashes(self, hashes: List[str]) -> List[str]:
+        # un solo round-trip para todos; el receipt completo (formateado por web3) sólo se pide de los minados
+        try:
+            responses = self._w3.provider.make_batch_request(
+                [("eth_getTransactionReceipt", [h]) for h in hashes]
+            )
+            if not isinstance(responses, list):
+                raise ValueError(responses.get("error") if isinstance(responses, dict) else responses)
+            return [h for h, r in zip(hashes, responses) if r.get("result")]
+        except Exception as e:
+            logger.debug(f"receipts: batch no disponible ({e}); consulta individual")
+        mined = []
+        for h in hashes:
+            try:
+                self._w3.eth.get_transaction_receipt(h)
+                mined.append(h)
+            except TransactionNotFound:
+                pass
+            except Exception as e:
+                logger.debug(f"receipt {h}: {e}")
+        return mined
 
     def get_transaction(self, tx_hash: str | HexBytes):
         return self._rpc_call("get_tx", lambda: self._w3.eth.get_transaction(tx_hash))
@@ -448,6 +847,20 @@ class Web3Service:
 
     def token_balance_tokens(self, token_address: str, wallet_address: Optional[str] = None) -> float:
         raw = self.token_balance_raw(token_address, wallet_address)
-        erc20 = self.load_erc20(token_address)
-        decimals = self.get_token_decimals(erc20)
-        return raw / (10 ** decimals)
+        return raw / POW10[self.token_decimals(token_address)]
+
+
+# Instancia compartida: cada Web3Service abre su propio HTTPProvider (sesión y sockets
+# keep-alive), carga ABIs y mantiene cachés/nonce locales; los controladores reutilizan una.
+_shared_service: Optional[Web3Service] = None
+_shared_lock = threading.Lock()
+
+
+def get_web3_service() -> Web3Service:
+    """Devuelve el Web3Service del proceso, creándolo en la primera llamada."""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_lock:
+            if _shared_service is None:
+                _shared_service = Web3Service()
+    return _shared_service
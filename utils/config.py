@@ -4,14 +4,18 @@ Configuration loading for bsc_sniper.
 This module provides a simple helper to load YAML configuration files from the
 project root. The file ``config.yaml`` is expected to reside alongside
 ``main.py``. If the file is missing, an empty dictionary is returned.
+
+It also exposes :class:`BuyConfig`, an immutable snapshot of the environment
+settings used on the buy path, resolved once at import time.
 """
 
 from __future__ import annotations
 
 import os
-from typing import Any, Dict
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
 
-import yaml  # type: ignore
+from web3 import Web3
 
 
 def load_config() -> Dict[str, Any]:
@@ -23,6 +27,57 @@ def load_config() -> Dict[str, Any]:
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir, os.pardir))
     config_path = os.path.join(base_dir, "config.yaml")
     if os.path.exists(config_path):
+        import yaml  # type: ignore
+
         with open(config_path, "r", encoding="utf-8") as f:
             return yaml.safe_load(f) or {}
     return {}
+
+
+def _env_bool(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() == "true"
+
+
+def _env_checksum(name: str) -> Optional[str]:
+    value = os.getenv(name)
+    if not value:
+        return None
+    try:
+        return Web3.to_checksum_address(value)
+    except Exception:
+        return None
+
+
+@dataclass(frozen=True, slots=True)
+class BuyConfig:
+    """Buy-path settings read from the environment.
+
+    Wei amounts are pre-computed, the PnL threshold is kept in basis points and
+    addresses are pre-checksummed so hot methods never touch ``os.environ`` or
+    re-parse values. Addresses that are missing
+    or invalid are ``None``.
+    """
+
+    cap_wei: int
+    wallet_cs: Optional[str]
+    wbnb_cs: Optional[str]
+    pnl_threshold_bps: int
+    max_fee_wei: int
+    dry_run: bool
+    first_real_buy: bool
+
+    @classmethod
+    def from_env(cls) -> "BuyConfig":
+        try:
+            cap_wei = int(Web3.to_wei(float(os.getenv("TEST_MAX_SPEND_BNB", "0.001")), "ether"))
+        except Exception:
+            cap_wei = int(Web3.to_wei(0.001, "ether"))
+        return cls(
+            cap_wei=cap_wei,
+            wallet_cs=_env_checksum("WALLET_ADDRESS"),
+            wbnb_cs=_env_checksum("WBNB_ADDRESS"),
+            pnl_threshold_bps=int(round(float(os.getenv("PNL_THRESHOLD_PERCENT", "2.0")) * 100)),
+            max_fee_wei=int(Web3.to_wei(float(os.getenv("MAX_FEE_BNB", "0.02")), "ether")),
+            dry_run=_env_bool("DRY_RUN", "true"),
+            first_real_buy=_env_bool("FIRST_REAL_BUY", "false"),
+        )
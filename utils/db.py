@@ -0,0 +1,54 @@
+from __future__ import annotations
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+# PRAGMAs por conexión: con WAL, synchronous=NORMAL sólo hace fsync en checkpoint
+_CONN_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",
+)
+
+_wal_ready: set[str] = set()
+_wal_lock = threading.Lock()
+
+
+def connect(db_path: str, check_same_thread: bool = True) -> sqlite3.Connection:
+    """
+    Abre una conexión SQLite configurada para el bot: filas sqlite3.Row, WAL en el fichero
+    (persistente, se activa una vez por ruta y proceso) y PRAGMAs de conexión.
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+    conn.row_factory = sqlite3.Row
+    if db_path not in _wal_ready:
+        with _wal_lock:
+            if db_path not in _wal_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                _wal_ready.add(db_path)
+    for pragma in _CONN_PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+@contextmanager
+def transaction(db_path: str) -> Iterator[sqlite3.Connection]:
+    """
+    Transacción explícita (BEGIN IMMEDIATE ... COMMIT) sobre una conexión propia, para agrupar
+    escrituras de varios repositorios en un único commit. Los métodos que reciben esta
+    conexión no deben hacer commit por su cuenta.
+    """
+    conn = connect(db_path)
+    conn.isolation_level = None  # el BEGIN/COMMIT lo gestionamos aquí
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
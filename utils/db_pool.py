@@ -0,0 +1,49 @@
+from __future__ import annotations
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from queue import Empty, Full, LifoQueue
+from typing import Iterator
+
+from utils.db import connect
+
+# Conexiones reutilizables por fichero de BD. LIFO: la conexión más reciente (páginas en caché) sale primero
+SQLITE_POOL_SIZE = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+
+_pools: dict[str, LifoQueue] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(db_path: str) -> LifoQueue:
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.setdefault(db_path, LifoQueue(maxsize=SQLITE_POOL_SIZE))
+    return pool
+
+
+@contextmanager
+def get_conn(db_path: str) -> Iterator[sqlite3.Connection]:
+    """
+    Presta una conexión del pool (o abre una nueva con los PRAGMAs de utils.db si está vacío).
+    Al salir hace commit, o rollback si hubo excepción, igual que `with sqlite3.Connection`,
+    y la devuelve al pool; si el pool está lleno se cierra.
+    Cada conexión la usa un solo hilo a la vez, de ahí check_same_thread=False.
+    """
+    pool = _pool(db_path)
+    try:
+        conn = pool.get_nowait()
+    except Empty:
+        conn = connect(db_path, check_same_thread=False)
+    try:
+        yield conn
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            pool.put_nowait(conn)
+        except Full:
+            conn.close()
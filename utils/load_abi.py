@@ -1,6 +1,9 @@
+import functools
 import json
 import os
 
+# Las ABIs no cambian en caliente: se leen y parsean una vez por proceso y ruta
+@functools.lru_cache(maxsize=8)
 def _load_abi(path: str) -> dict:
     if not os.path.isfile(path):
         raise FileNotFoundError(f"ABI no encontrado: {path}")
@@ -1,7 +1,7 @@
 from __future__ import annotations
 import logging
 from logging.handlers import RotatingFileHandler
-import os, functools, time
+import os, functools, itertools, time
 from pathlib import Path
 
 _DEFAULT_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
@@ -58,17 +58,33 @@ class _LoggerManager:
 
 logger_manager = _LoggerManager()
 
-def log_function(func):
+def log_function(func=None, *, sample_rate: int = 1):
+    """
+    Traza entrada/salida/tiempo en DEBUG y registra excepciones siempre.
+    Uso: @log_function o @log_function(sample_rate=N) para trazar sólo 1 de cada N llamadas
+    (métodos sondeados en bucle); las excepciones no se muestrean.
+    """
+    if func is None:
+        return functools.partial(log_function, sample_rate=sample_rate)
+    logger: logging.Logger | None = None
+    calls = itertools.count() if sample_rate > 1 else None
+
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
-        logger = logger_manager.setup_logger(func.__module__)
-        logger.debug(f"→ {func.__name__} args={args} kwargs={kwargs}")
-        t0 = time.time()
+        nonlocal logger
+        if logger is None:
+            logger = logger_manager.setup_logger(func.__module__)
+        # sin DEBUG no se formatean args ni se mide tiempo; los errores se registran igual
+        debug = logger.isEnabledFor(logging.DEBUG) and (calls is None or next(calls) % sample_rate == 0)
+        if debug:
+            logger.debug("→ %s args=%s kwargs=%s", func.__name__, args, kwargs)
+            t0 = time.perf_counter()
         try:
             result = func(*args, **kwargs)
-            logger.debug(f"← {func.__name__} ({(time.time()-t0)*1000:.1f} ms)")
-            return result
         except Exception as e:
-            logger.exception(f"✗ {func.__name__}: {e}")
+            logger.exception("✗ %s: %s", func.__name__, e)
             raise
+        if debug:
+            logger.debug("← %s (%.1f ms)", func.__name__, (time.perf_counter() - t0) * 1000)
+        return result
     return wrapper